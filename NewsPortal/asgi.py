@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'NewsPortal.settings')
+# Под ASGI читающие страницы обслуживают асинхронные представления (news.async_views)
+os.environ.setdefault('NEWS_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
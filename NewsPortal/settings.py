@@ -42,7 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'news.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'news.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -51,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.contrib.flatpages.middleware.FlatpageFallbackMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'news.db_router.read_only_request_middleware',
 ]
 
 ROOT_URLCONF = 'NewsPortal.urls'
@@ -84,6 +87,50 @@ DATABASES = {
     }
 }
 
+# DATABASE_PROFILE=production: WAL, прагмы и таймаут ожидания блокировки на каждом соединении,
+# постоянные соединения и отдельное соединение только для чтения для GET-запросов
+DATABASE_PROFILE = os.getenv('DATABASE_PROFILE', 'development')
+if DATABASE_PROFILE == 'production':
+    SQLITE_PRAGMAS = (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        f"PRAGMA cache_size=-{os.getenv('DB_CACHE_KB', '20000')};"
+        'PRAGMA temp_store=MEMORY;'
+        f"PRAGMA mmap_size={os.getenv('DB_MMAP_BYTES', '134217728')};"
+    )
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS,
+            # Секунды ожидания занятой базы вместо мгновенного "database is locked"
+            'timeout': float(os.getenv('DB_BUSY_TIMEOUT', '20')),
+            # Блокировка записи берётся в начале транзакции: без тупика при повышении чтения до записи
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;',
+            'timeout': DATABASES['default']['OPTIONS']['timeout'],
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['news.db_router.ReadWriteRouter']
+
+
+# --- Cache ---
+# По умолчанию — память процесса. Чтобы инвалидация сигналами была видна всем
+# воркерам, в продакшене задайте общий бэкенд, например:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'newsportal'),
+    }
+}
+
 
 # --- Password validation ---
 AUTH_PASSWORD_VALIDATORS = [
@@ -114,6 +161,14 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / "static"
 ]
+# collectstatic собирает сюда файлы с хэшем в имени, манифест и сжатые .gz/.br
+STATIC_ROOT = os.getenv('STATIC_ROOT', str(BASE_DIR / 'staticfiles'))
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'news.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Сколько браузер хранит статику с хэшем в имени без перепроверки (сек)
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', str(365 * 24 * 60 * 60)))
 
 
 # --- Default primary key field type ---
@@ -149,6 +204,19 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_HOST_USER')
 
+# Пакетная доставка писем (news.mailer): размер пачки, число SMTP-соединений,
+# общий лимит писем в секунду (0 — без лимита)
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '50'))
+EMAIL_POOL_SIZE = int(os.getenv('EMAIL_POOL_SIZE', '4'))
+EMAIL_RATE_LIMIT = float(os.getenv('EMAIL_RATE_LIMIT', '0'))
+
+# Адрес сайта для ссылок в письмах
+SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
+
+# Outbox уведомлений о новых постах (команда send_notifications)
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '5'))
+NOTIFICATION_RETRY_BASE_SECONDS = int(os.getenv('NOTIFICATION_RETRY_BASE_SECONDS', '30'))
+
 ACCOUNT_FORMS = {
     'signup': 'news.forms.CustomSignupForm',  # ← будет ниже
 }
@@ -157,4 +225,41 @@ ACCOUNT_FORMS = {
 # Перенаправления
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
-ACCOUNT_LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file
+ACCOUNT_LOGOUT_REDIRECT_URL = '/'
+
+# --- News ---
+# Курсорная (keyset) пагинация списков вместо OFFSET + COUNT(*)
+NEWS_CURSOR_PAGINATION = os.getenv('NEWS_CURSOR_PAGINATION', 'False') == 'True'
+# Асинхронные читающие страницы (news.async_views); asgi.py включает их по умолчанию
+NEWS_ASYNC_VIEWS = os.getenv('NEWS_ASYNC_VIEWS', 'False') == 'True'
+
+# Планировщик (manage.py runscheduler): срок аренды лидерства в секундах
+SCHEDULER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEASE_SECONDS', '60'))
+APSCHEDULER_DATETIME_FORMAT = 'N j, Y, f:s a'
+APSCHEDULER_RUN_NOW_TIMEOUT = 25
+
+# Кэш страниц для анонимных пользователей (инвалидация — сигналами по версиям)
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '3600'))
+# Сколько первых страниц списка прогревать после публикации поста (0 — не прогревать).
+# Прогревает процесс runscheduler раз в PAGE_CACHE_WARM_INTERVAL секунд, если список изменился
+PAGE_CACHE_WARM_PAGES = int(os.getenv('PAGE_CACHE_WARM_PAGES', '0'))
+PAGE_CACHE_WARM_INTERVAL = int(os.getenv('PAGE_CACHE_WARM_INTERVAL', '30'))
+
+# Интервал (сек) пакетной записи лайков/дизлайков; 0 — писать сразу
+VOTE_FLUSH_INTERVAL = float(os.getenv('VOTE_FLUSH_INTERVAL', '1.0'))
+
+# Замеры запросов (news.metrics): заголовок Server-Timing, гистограммы на /metrics.
+# Server-Timing видит любой посетитель — по умолчанию только при DEBUG
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', str(DEBUG)) == 'True'
+# Кому отдавать /metrics (через запятую); пусто — всем
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+# Окно последних запросов для квантилей
+METRICS_WINDOW = int(os.getenv('METRICS_WINDOW', '1000'))
+# Запросы дольше SLOW_REQUEST_MS пишутся в журнал с самыми тяжёлыми SQL — доля SLOW_REQUEST_SAMPLE_RATE из них
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '500'))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', '1.0'))
+
+# Лимиты действий (news.ratelimit): (сколько, за сколько секунд) на пользователя
+RATE_LIMITS = {
+    'publish_post': (int(os.getenv('POST_DAILY_LIMIT', '3')), 24 * 60 * 60),
+}
@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from news.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('allauth.urls')),
     path('news/', include('news.urls')),
     path('articles/', include('news.article_urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
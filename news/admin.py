@@ -1,32 +1,130 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
+from django.utils.functional import cached_property
 from .models import Post, Comment, Category, Author, PostCategory
 
+
+# ==================== ФИЛЬТРЫ И ПАГИНАЦИЯ ДЛЯ БОЛЬШИХ ТАБЛИЦ ====================
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """Фильтр по связи с поиском (select2) вместо списка всех объектов в боковой панели.
+
+    Загружается только выбранный объект; варианты подгружает autocomplete-view
+    админки, поэтому у админки связанной модели должны быть search_fields.
+    """
+    template = 'admin/news/autocomplete_filter.html'
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        return field.get_choices(include_blank=False, limit_choices_to={'pk__in': self.lookup_val})
+
+    def has_output(self):
+        return True
+
+    def autocomplete_widget(self):
+        remote_model = self.field.remote_field.model
+        form_field = forms.ModelChoiceField(
+            queryset=remote_model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, self.model_admin.admin_site),
+            required=False,
+        )
+        value = self.lookup_val[-1] if self.lookup_val else None
+        return form_field.widget.render(
+            self.lookup_kwarg, value, attrs={'id': f'autocomplete-filter-{self.field_path}'}
+        )
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.model_admin = model_admin
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор без полного COUNT(*): без фильтров — оценка из sqlite_stat1 (после ANALYZE),
+    с фильтрами — счёт с верхней границей"""
+    max_exact_count = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where and connection.vendor == 'sqlite':
+            estimate = self.table_estimate(self.object_list.model._meta.db_table)
+            if estimate is not None:
+                return estimate
+        return self.object_list.order_by()[:self.max_exact_count].count()
+
+    @staticmethod
+    def table_estimate(table):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # Первое число stat — строк в таблице (для любого индекса таблицы)
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            row = cursor.fetchone()
+        return int(row[0].split()[0]) if row else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = ApproximateCountPaginator
+    # Не считать «всего N» вторым COUNT(*) по всей таблице
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        # Скрипты select2/autocomplete для AutocompleteFilter
+        return super().media + AutocompleteSelect(Post._meta.get_field('author'), self.admin_site).media
+
+
+# ==================== АДМИНКИ ====================
+
 class PostCategoryInline(admin.TabularInline):
     model = PostCategory
     extra = 1
     autocomplete_fields = ['category']
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = ('title', 'display_categories', 'author', 'rating', 'post_type', 'created_at')
     search_fields = ('title', 'content')
-    list_filter = ('categories', 'post_type', 'author')
+    list_filter = (('categories', AutocompleteFilter), 'post_type', ('author', AutocompleteFilter))
+    list_select_related = ('author__user',)
+    # Рейтинг меняется только голосами: правка здесь разошлась бы с рейтингом автора
+    readonly_fields = ('rating',)
     inlines = [PostCategoryInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('categories')
+
     def display_categories(self, obj):
         return ", ".join([cat.name for cat in obj.categories.all()])
     display_categories.short_description = 'Категории'
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('text', 'display_category', 'user', 'rating', 'created_at')
     search_fields = ('text',)
-    list_filter = ('user',)
+    list_filter = (('user', AutocompleteFilter),)
+    # post нужен для __str__ комментария
+    list_select_related = ('user', 'post')
+    readonly_fields = ('rating',)
+
+    def get_queryset(self, request):
+        first_category = (
+            PostCategory.objects
+            .filter(post=OuterRef('post'))
+            .order_by('category_id')
+            .values('category__name')[:1]
+        )
+        return super().get_queryset(request).annotate(first_category_name=Subquery(first_category))
 
     def display_category(self, obj):
-        first_cat = obj.post.categories.first()
-        return first_cat.name if first_cat else None
+        return obj.first_category_name
     display_category.short_description = 'Категория поста'
 
 
@@ -35,6 +133,8 @@ class AuthorAdmin(admin.ModelAdmin):
     list_display = ('user', 'rating')
     readonly_fields = ('rating',)
     fields = ('user', 'rating')
+    search_fields = ('user__username', 'user__email')
+    list_select_related = ('user',)
 
 
 @admin.register(Category)
@@ -42,7 +142,10 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'get_subscribers_count')
     search_fields = ('name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(subscribers_count=Count('subscribers'))
+
     def get_subscribers_count(self, obj):
-        return obj.subscribers.count()
+        return obj.subscribers_count
     get_subscribers_count.short_description = 'Подписчиков'
-
+    get_subscribers_count.admin_order_field = 'subscribers_count'
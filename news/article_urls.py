@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     ArticleCreate,
@@ -9,10 +10,18 @@ from .views import (
 
 app_name = 'articles'
 
+if settings.NEWS_ASYNC_VIEWS:
+    from . import async_views
+    news_list_view = async_views.news_list
+    article_detail_view = async_views.article_detail
+else:
+    news_list_view = NewsList.as_view()
+    article_detail_view = ArticleDetail.as_view()
+
 urlpatterns = [
-    path('', NewsList.as_view(), name='news_list'),
+    path('', news_list_view, name='news_list'),
     path('create/', ArticleCreate.as_view(), name='article_create'),
-    path('<int:pk>/', ArticleDetail.as_view(), name='article_detail'),
+    path('<int:pk>/', article_detail_view, name='article_detail'),
     path('<int:pk>/edit/', ArticleEdit.as_view(), name='article_edit'),
     path('<int:pk>/delete/', ArticleDelete.as_view(), name='article_delete'),
 ]
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""Асинхронные читающие страницы для ASGI-развёртывания (NEWS_ASYNC_VIEWS).
+
+Запросы идут через async ORM, пользователь, его роли и навигация загружаются
+заранее — рендеринг шаблона (его Django выполняет в потоке) к БД не обращается.
+Исключение — форма фильтров поиска: варианты авторов и категорий читает виджет.
+Шаблоны и контекст те же, что у синхронных представлений в views.py.
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.template.response import TemplateResponse
+
+from .caching import aget_categories_navigation, aget_user_roles
+from .filters import NewsFilter
+from .models import Category, Post
+from .page_cache import (
+    CATEGORIES,
+    PAGE_TIMEOUT,
+    aget_versions,
+    async_cached_page,
+    attach_post_versions,
+    is_conditional,
+    not_modified,
+    post_etag,
+    post_scope,
+    set_validators,
+    updated_at_query,
+)
+from .pagination import CursorPaginator, aget_offset_page, pagination_query, use_cursor_pagination
+from .views import (
+    ArticleDetail,
+    CategoryListView,
+    NewsDetail,
+    NewsList,
+    attach_category_state,
+    latest_posts_links,
+    subscribed_category_ids,
+)
+
+
+async def prepare_request(request):
+    """Пользователь, роли и навигация — асинхронно и до рендеринга (см. context_processors)"""
+    user = await request.auser()
+    request.user = user
+    await aget_user_roles(user)
+    request.categories_navigation = await aget_categories_navigation()
+    return user
+
+
+def with_prepared_request(view):
+    async def wrapper(request, *args, **kwargs):
+        await prepare_request(request)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def paginate(request, queryset, per_page, strict=False):
+    """(page_obj, cursor_mode): курсорная или обычная пагинация, как в синхронных представлениях"""
+    if use_cursor_pagination(request, queryset):
+        return await CursorPaginator(queryset, per_page).aget_page(request.GET.get('cursor')), True
+    page_obj = await aget_offset_page(Paginator(queryset, per_page), request.GET.get('page'), strict)
+    return page_obj, False
+
+
+# ==================== СПИСОК И ПОИСК ====================
+
+@with_prepared_request
+@async_cached_page('NewsList')
+async def news_list(request):
+    queryset = Post.objects.for_list().order_by(NewsList.ordering)
+    page_obj, cursor_mode = await paginate(request, queryset, NewsList.paginate_by, strict=True)
+    categories_version, = await aget_versions(CATEGORIES)
+    return TemplateResponse(request, NewsList.template_name, {
+        'paginator': None if cursor_mode else page_obj.paginator,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'newslist': attach_post_versions(page_obj.object_list),
+        'cursor_mode': cursor_mode,
+        'pagination_query': pagination_query(request),
+        'categories_version': categories_version,
+        'row_cache_timeout': PAGE_TIMEOUT,
+    })
+
+
+@with_prepared_request
+async def news_search(request):
+    filter = NewsFilter(request.GET, queryset=Post.objects.for_list().order_by('-created_at'))
+    # Валидация формы фильтра читает авторов и категории — синхронный код django-filter
+    queryset = await sync_to_async(lambda: filter.qs)()
+    page_obj, cursor_mode = await paginate(request, queryset, 10)
+    return TemplateResponse(request, 'news_search.html', {
+        'filter': filter,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'cursor_mode': cursor_mode,
+        'pagination_query': pagination_query(request),
+    })
+
+
+# ==================== ДЕТАЛЬНЫЕ СТРАНИЦЫ ====================
+
+def post_detail(view_class):
+    """Аналог BasePostDetail: 304 по валидаторам, кэш страниц, затем загрузка поста"""
+    post_type, template_name = view_class.post_type, view_class.template_name
+
+    async def view(request, pk):
+        if is_conditional(request):
+            response = not_modified(request, pk, await updated_at_query(Post, pk, post_type).afirst())
+            if response is not None:
+                return response
+        return await render_post(request, pk=pk)
+
+    # Имя как у синхронного CachedPageMixin — кэш страниц общий
+    @async_cached_page(view_class.__name__, lambda request, pk: [post_scope(pk), CATEGORIES])
+    async def render_post(request, pk):
+        try:
+            post = await (
+                Post.objects.select_related('author__user').prefetch_related('categories')
+                .aget(pk=pk, post_type=post_type)
+            )
+        except Post.DoesNotExist:
+            raise Http404('Пост не найден')
+        roles = await aget_user_roles(request.user)
+        response = TemplateResponse(request, template_name, {
+            'object': post,
+            'newsdetail': post,
+            'is_not_author': not roles['in_authors_group'],
+        })
+        if 'messages' not in request.COOKIES:
+            set_validators(response, post_etag(request, pk, post.updated_at))
+        return response
+
+    return with_prepared_request(view)
+
+
+news_detail = post_detail(NewsDetail)
+article_detail = post_detail(ArticleDetail)
+
+
+# ==================== КАТЕГОРИИ ====================
+
+@with_prepared_request
+async def category_list(request):
+    queryset = Category.objects.order_by(CategoryListView.ordering)
+    paginator = Paginator(queryset, CategoryListView.paginate_by)
+    page_obj = await aget_offset_page(paginator, request.GET.get('page'), strict=True)
+    categories = page_obj.object_list
+    ids = [category.pk for category in categories]
+    links = [link async for link in latest_posts_links(ids, CategoryListView.latest_posts_count)]
+    subscribed = set()
+    if request.user.is_authenticated:
+        subscribed = {pk async for pk in subscribed_category_ids(request.user, ids)}
+    return TemplateResponse(request, CategoryListView.template_name, {
+        'paginator': page_obj.paginator,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'categories': attach_category_state(categories, links, subscribed),
+    })
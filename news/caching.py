@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import Author, Category
+
+CATEGORIES_NAVIGATION_KEY = 'news:categories_navigation'
+USER_ROLES_KEY = 'news:user_roles:{}'
+# Ключи инвалидируются сигналами; таймаут — лишь страховка от рассинхрона
+TIMEOUT = 60 * 60
+
+
+# ==================== НАВИГАЦИЯ ПО КАТЕГОРИЯМ ====================
+
+def get_categories_navigation():
+    return cache.get_or_set(CATEGORIES_NAVIGATION_KEY, lambda: list(Category.objects.all()[:8]), TIMEOUT)
+
+
+async def aget_categories_navigation():
+    navigation = await cache.aget(CATEGORIES_NAVIGATION_KEY)
+    if navigation is None:
+        navigation = [category async for category in Category.objects.all()[:8]]
+        await cache.aset(CATEGORIES_NAVIGATION_KEY, navigation, TIMEOUT)
+    return navigation
+
+
+def invalidate_categories_navigation():
+    cache.delete(CATEGORIES_NAVIGATION_KEY)
+
+
+# ==================== РОЛИ ПОЛЬЗОВАТЕЛЯ ====================
+
+NO_ROLES = {'has_author': False, 'in_authors_group': False}
+
+
+def _user_roles_query(user):
+    authors_group = Group.objects.filter(name='authors', user=OuterRef('pk'))
+    return (
+        get_user_model().objects
+        .filter(pk=user.pk)
+        .annotate(
+            has_author=Exists(Author.objects.filter(user=OuterRef('pk'))),
+            in_authors_group=Exists(authors_group),
+        )
+        .values('has_author', 'in_authors_group')
+    )
+
+
+def _load_user_roles(user):
+    return _user_roles_query(user).first() or NO_ROLES
+
+
+def get_user_roles(user):
+    """{'has_author', 'in_authors_group'} — один раз на запрос (запоминается на объекте user),
+    между запросами — из кэша"""
+    if not user.is_authenticated:
+        return NO_ROLES
+
+    roles = getattr(user, '_news_roles', None)
+    if roles is None:
+        key = USER_ROLES_KEY.format(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = _load_user_roles(user)
+            cache.set(key, roles, TIMEOUT)
+        user._news_roles = roles
+    return roles
+
+
+async def aget_user_roles(user):
+    """Асинхронный get_user_roles; запомненные на user роли видит и синхронный вариант"""
+    if not user.is_authenticated:
+        return NO_ROLES
+
+    roles = getattr(user, '_news_roles', None)
+    if roles is None:
+        key = USER_ROLES_KEY.format(user.pk)
+        roles = await cache.aget(key)
+        if roles is None:
+            roles = await _user_roles_query(user).afirst() or NO_ROLES
+            await cache.aset(key, roles, TIMEOUT)
+        user._news_roles = roles
+    return roles
+
+
+def invalidate_user_roles(*user_ids):
+    cache.delete_many([USER_ROLES_KEY.format(pk) for pk in user_ids])
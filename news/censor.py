@@ -0,0 +1,89 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from news import resources
+
+
+class CensorEngine:
+    """Цензор: одно регулярное выражение на весь словарь + LRU готовых результатов.
+
+    Ключ LRU — хэш текста, а не сам текст; тексты длиннее max_cached_length
+    (полные статьи) не кэшируются вовсе, так что память кэша ограничена
+    cache_size × max_cached_length.
+    """
+
+    def __init__(self, words=None, cache_size=2048, max_cached_length=4096):
+        self.cache_size = cache_size
+        self.max_cached_length = max_cached_length
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.reload(words)
+
+    def reload(self, words=None):
+        """Пересобирает шаблон. Без аргументов берёт актуальный news.resources.CENSORED_WORDS"""
+        if words is None:
+            words = resources.CENSORED_WORDS
+
+        # Длинные слова первыми, чтобы «нахрен» не перехватывался «хрен»
+        words = sorted({w.lower() for w in words if len(w) > 1}, key=len, reverse=True)
+        pattern = None
+        if words:
+            pattern = re.compile(
+                r'\b(?:{})\b'.format('|'.join(re.escape(w) for w in words)),
+                re.IGNORECASE
+            )
+
+        with self._lock:
+            self._pattern = pattern
+            self._cache.clear()
+
+    @staticmethod
+    def _mask(match):
+        matched_word = match.group()
+        return matched_word[0] + '*' * (len(matched_word) - 1)
+
+    def censor(self, text):
+        if not isinstance(text, str):
+            return text
+
+        pattern = self._pattern
+        if pattern is None:
+            return text
+        if len(text) > self.max_cached_length:
+            return pattern.sub(self._mask, text)
+
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        result = pattern.sub(self._mask, text)
+
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def cache_info(self):
+        return {'size': len(self._cache), 'maxsize': self.cache_size}
+
+
+engine = CensorEngine(
+    cache_size=getattr(settings, 'CENSOR_CACHE_SIZE', 2048),
+    max_cached_length=getattr(settings, 'CENSOR_CACHE_MAX_LENGTH', 4096),
+)
+
+
+def censor(text):
+    return engine.censor(text)
+
+
+def reload_censored_words(words=None):
+    engine.reload(words)
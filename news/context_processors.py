@@ -1,14 +1,19 @@
-from .models import Category
+from django.utils.functional import SimpleLazyObject
+
+from .caching import get_categories_navigation, get_user_roles
+
 
 def author_status(request):
-    is_not_author = False
-    if request.user.is_authenticated:
-        is_not_author = not hasattr(request.user, 'author')
     return {
-        'is_not_author': is_not_author
+        'is_not_author': SimpleLazyObject(
+            lambda: request.user.is_authenticated and not get_user_roles(request.user)['has_author']
+        )
     }
 
 def categories_context(request):
+    # Асинхронные представления загружают навигацию заранее (см. async_views.prepare_request),
+    # чтобы рендеринг шаблона не обращался к БД
+    preloaded = getattr(request, 'categories_navigation', None)
     return {
-        'categories_navigation': Category.objects.all()[:8]
-    }
\ No newline at end of file
+        'categories_navigation': preloaded if preloaded is not None else SimpleLazyObject(get_categories_navigation)
+    }
@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+READ_ALIAS = 'replica'
+
+_read_only = ContextVar('news_read_only', default=False)
+
+
+@contextmanager
+def read_only():
+    """Чтения внутри блока можно отдавать соединению только для чтения"""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+class ReadWriteRouter:
+    """Записи — в default, чтения читающих запросов (GET/HEAD) — в соединение READ_ALIAS.
+
+    Внутри транзакции на default чтения остаются на нём, чтобы видеть свои же записи.
+    Без READ_ALIAS в DATABASES роутер ничего не меняет.
+    """
+
+    def has_replica(self):
+        return READ_ALIAS in settings.DATABASES
+
+    def db_for_read(self, model, **hints):
+        if not _read_only.get() or not self.has_replica():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Оба соединения смотрят в одну и ту же базу
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, READ_ALIAS}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@sync_and_async_middleware
+def read_only_request_middleware(get_response):
+    """Помечает читающие запросы: их чтения роутер отправляет в READ_ALIAS"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if request.method not in SAFE_METHODS:
+                return await get_response(request)
+            token = _read_only.set(True)
+            try:
+                return await get_response(request)
+            finally:
+                _read_only.reset(token)
+        return middleware
+
+    def middleware(request):
+        if request.method not in SAFE_METHODS:
+            return get_response(request)
+        with read_only():
+            return get_response(request)
+    return middleware
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils.html import escape, strip_tags
+
+from .models import Category
+
+# Вместо имени подписчика тело рендерится с маркером, который потом подменяется
+SUBSCRIBER_PLACEHOLDER = '\x00subscriber\x00'
+
+
+@dataclass
+class CategoryDigest:
+    category: Category
+    subject: str
+    html: str
+    text: str
+    posts_count: int
+
+    def message_for(self, subscriber):
+        """Персонализация — две замены строки вместо рендера шаблона"""
+        msg = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.text.replace(SUBSCRIBER_PLACEHOLDER, subscriber.username),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[subscriber.email]
+        )
+        msg.attach_alternative(self.html.replace(SUBSCRIBER_PLACEHOLDER, escape(subscriber.username)), "text/html")
+        return msg
+
+
+def categories_with_subscribers():
+    return Category.objects.filter(subscribers__isnull=False).distinct().order_by('pk')
+
+
+def build_category_digest(category, since):
+    """Посты категории за период загружаются и рендерятся один раз на категорию"""
+    posts = list(
+        category.posts
+        .filter(created_at__gte=since)
+        .select_related('author__user')
+        .defer('content')
+        .order_by('-created_at')
+    )
+    if not posts:
+        return None
+
+    new_posts = [{
+        'title': post.title,
+        'author': post.author.user.username,
+        'created_at': post.created_at,
+        'preview': post.excerpt,
+        'url': f"{settings.SITE_URL}{post.get_absolute_url()}",
+    } for post in posts]
+
+    html = render_to_string(
+        'email/weekly_digest.html',
+        {
+            'subscriber': {'username': SUBSCRIBER_PLACEHOLDER},
+            'category': category,
+            'new_posts': new_posts,
+            'week_ago': since,
+            'site_url': settings.SITE_URL,
+        }
+    )
+    return CategoryDigest(
+        category=category,
+        subject=f'Еженедельная рассылка: новые статьи в категории "{category.name}"',
+        html=html,
+        text=strip_tags(html),
+        posts_count=len(new_posts),
+    )
+
+
+def iter_subscribers(category, chunk_size=2000):
+    """Подписчики потоком, без загрузки всей категории в память"""
+    return (
+        category.subscribers
+        .exclude(email='')
+        .only('pk', 'username', 'email')
+        .order_by('pk')
+        .iterator(chunk_size=chunk_size)
+    )
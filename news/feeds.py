@@ -0,0 +1,162 @@
+"""Потоковые ленты RSS 2.0, Atom и JSON Feed: общая и по категориям"""
+import hashlib
+import json
+from datetime import timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+
+from .censor import censor
+from .models import Post
+from .page_cache import LIST, get_versions, list_changed_at
+
+FEED_ITEMS = getattr(settings, 'FEED_ITEMS', 50)
+FEED_MAX_ITEMS = getattr(settings, 'FEED_MAX_ITEMS', 200)
+# Агрегаторы опрашивают часто: минута в кэше по пути, дальше — условный GET
+FEED_MAX_AGE = getattr(settings, 'FEED_MAX_AGE', 60)
+
+
+# ==================== ВЫБОРКА И ВАЛИДАТОРЫ ====================
+
+def feed_params(request):
+    """Ограничения ленты из запроса: ?limit= (не больше FEED_MAX_ITEMS) и ?days="""
+    try:
+        limit = min(max(int(request.GET.get('limit', FEED_ITEMS)), 1), FEED_MAX_ITEMS)
+    except ValueError:
+        limit = FEED_ITEMS
+    try:
+        days = max(int(request.GET['days']), 1)
+    except (KeyError, ValueError):
+        days = None
+    return limit, days
+
+
+def feed_queryset(category_id=None, days=None):
+    qs = Post.objects.all()
+    if category_id is not None:
+        qs = qs.filter(categories=category_id)
+    if days is not None:
+        qs = qs.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    return qs
+
+
+def newest_post_time(category_id=None, days=None):
+    """Время последнего изменения ленты: последняя правка поста (агрегат по индексу updated_at,
+    без выборки самой ленты) или удаление — его видно только по времени смены версии LIST"""
+    newest = feed_queryset(category_id, days).aggregate(newest=Max('updated_at'))['newest']
+    changed = list_changed_at()
+    if newest is None or changed is None:
+        return newest
+    return max(newest, changed)
+
+
+def feed_etag(fmt, category_id, limit, days, newest):
+    # Версия LIST меняется при любом изменении постов, в т.ч. правке и удалении старых
+    version = get_versions(LIST)[0]
+    raw = f'{fmt}|{category_id}|{limit}|{days}|{newest.isoformat()}|{version}'
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def feed_items(category_id=None, limit=FEED_ITEMS, days=None):
+    return (
+        feed_queryset(category_id, days)
+        .for_list()
+        .order_by('-created_at', '-pk')[:limit]
+        .iterator(chunk_size=50)
+    )
+
+
+def item_fields(post):
+    return {
+        'title': censor(post.title),
+        'link': f'{settings.SITE_URL}{post.get_absolute_url()}',
+        'summary': post.excerpt_censored,
+        'author': post.author.user.username,
+        'categories': [category.name for category in post.categories.all()],
+        'created_at': post.created_at,
+    }
+
+
+# ==================== ФОРМАТЫ ====================
+# Каждый генератор отдаёт документ кусками: заголовок, по элементу на пост, хвост.
+
+def rss(meta, posts):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+        f'<title>{escape(meta["title"])}</title><link>{escape(meta["link"])}</link>'
+        f'<description>{escape(meta["title"])}</description><language>ru</language>'
+        f'<atom:link href={quoteattr(meta["feed_url"])} rel="self"/>'
+        f'<lastBuildDate>{rfc2822_date(meta["updated"])}</lastBuildDate>'
+    )
+    for post in posts:
+        item = item_fields(post)
+        categories = ''.join(f'<category>{escape(name)}</category>' for name in item['categories'])
+        yield (
+            f'<item><title>{escape(item["title"])}</title><link>{escape(item["link"])}</link>'
+            f'<description>{escape(item["summary"])}</description>'
+            f'<dc:creator xmlns:dc="http://purl.org/dc/elements/1.1/">{escape(item["author"])}</dc:creator>'
+            f'<pubDate>{rfc2822_date(item["created_at"])}</pubDate>'
+            f'<guid isPermaLink="true">{escape(item["link"])}</guid>{categories}</item>'
+        )
+    yield '</channel></rss>\n'
+
+
+def atom(meta, posts):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="ru">'
+        f'<title>{escape(meta["title"])}</title>'
+        f'<link href={quoteattr(meta["link"])} rel="alternate"/>'
+        f'<link href={quoteattr(meta["feed_url"])} rel="self"/>'
+        f'<id>{escape(meta["feed_url"])}</id><updated>{rfc3339_date(meta["updated"])}</updated>'
+    )
+    for post in posts:
+        item = item_fields(post)
+        categories = ''.join(f'<category term={quoteattr(name)}/>' for name in item['categories'])
+        yield (
+            f'<entry><title>{escape(item["title"])}</title>'
+            f'<link href={quoteattr(item["link"])} rel="alternate"/>'
+            f'<id>{escape(item["link"])}</id>'
+            f'<published>{rfc3339_date(item["created_at"])}</published>'
+            f'<updated>{rfc3339_date(item["created_at"])}</updated>'
+            f'<author><name>{escape(item["author"])}</name></author>'
+            f'<summary type="text">{escape(item["summary"])}</summary>{categories}</entry>'
+        )
+    yield '</feed>\n'
+
+
+def json_feed(meta, posts):
+    header = {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': meta['title'],
+        'home_page_url': meta['link'],
+        'feed_url': meta['feed_url'],
+        'language': 'ru',
+    }
+    # Открываем массив items вручную, чтобы отдавать элементы по одному
+    yield json.dumps(header, ensure_ascii=False)[:-1] + ', "items": ['
+    for i, post in enumerate(posts):
+        item = item_fields(post)
+        entry = {
+            'id': item['link'],
+            'url': item['link'],
+            'title': item['title'],
+            'summary': item['summary'],
+            'content_text': item['summary'],
+            'date_published': rfc3339_date(item['created_at']),
+            'authors': [{'name': item['author']}],
+            'tags': item['categories'],
+        }
+        yield (', ' if i else '') + json.dumps(entry, ensure_ascii=False)
+    yield ']}\n'
+
+
+FORMATS = {
+    'rss': ('application/rss+xml; charset=utf-8', rss),
+    'atom': ('application/atom+xml; charset=utf-8', atom),
+    'json': ('application/feed+json; charset=utf-8', json_feed),
+}
@@ -1,9 +1,15 @@
 import django_filters
 from .models import Post, Author, Category
+from .search import search_posts
 from django import forms
 
 
 class NewsFilter(django_filters.FilterSet):
+    q = django_filters.CharFilter(
+        method='filter_fulltext',
+        label='Поиск по тексту'
+    )
+
     title = django_filters.CharFilter(
         field_name='title',
         lookup_expr='icontains',
@@ -12,7 +18,7 @@ class NewsFilter(django_filters.FilterSet):
 
     author = django_filters.ModelChoiceFilter(
         field_name='author',
-        queryset=Author.objects.all(),
+        queryset=Author.objects.select_related('user'),
         label='Автор',
         empty_label='Все авторы'
     )
@@ -33,7 +39,9 @@ class NewsFilter(django_filters.FilterSet):
         conjoined=True
     )
 
-
     class Meta:
         model = Post
-        fields = []
\ No newline at end of file
+        fields = []
+
+    def filter_fulltext(self, queryset, name, value):
+        return search_posts(queryset, value)
\ No newline at end of file
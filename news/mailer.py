@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket: не больше rate писем в секунду на все соединения вместе. rate <= 0 — без лимита.
+    Ёмкость ведра — rate (но не меньше одного письма): всплеск не больше секунды трафика"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        # При rate < 1 ведро на rate жетонов никогда не набрало бы целого письма
+        self.capacity = max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """Списывает count жетонов — по одному на письмо, ожидая недостающие"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                taken = min(count, int(self._tokens))
+                self._tokens -= taken
+                count -= taken
+                if not count:
+                    return
+                # Ждём ровно до следующего целого жетона
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limiter():
+    """Один лимитер EMAIL_RATE_LIMIT на процесс: его делят все Mailer, сколько бы их ни создавалось"""
+    global _shared_limiter
+    rate = getattr(settings, 'EMAIL_RATE_LIMIT', 0)
+    with _shared_lock:
+        if _shared_limiter is None or _shared_limiter.rate != rate:
+            _shared_limiter = RateLimiter(rate)
+        return _shared_limiter
+
+
+@dataclass
+class BatchStats:
+    size: int
+    sent: int
+    failed: int
+    seconds: float
+
+    @property
+    def per_second(self):
+        return self.sent / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class DeliveryReport:
+    sent: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+    batches: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def per_second(self):
+        return len(self.sent) / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f'отправлено {len(self.sent)}, ошибок {len(self.failed)}, '
+                f'пачек {len(self.batches)}, {self.per_second:.1f} писем/с')
+
+
+class Mailer:
+    """Доставка писем пачками по нескольким постоянным соединениям.
+
+    Каждый поток пула держит своё соединение и переиспользует его между пачками
+    (одно TLS-рукопожатие на поток, а не на письмо). Общий лимит скорости
+    списывается по пачке целиком.
+    """
+
+    def __init__(self, batch_size=None, connections=None, rate_limit=None, backend=None, **connection_kwargs):
+        self.batch_size = batch_size or getattr(settings, 'EMAIL_BATCH_SIZE', 50)
+        self.connections = connections or getattr(settings, 'EMAIL_POOL_SIZE', 4)
+        # Без явного rate_limit — общий на процесс лимит EMAIL_RATE_LIMIT
+        self.rate_limiter = shared_rate_limiter() if rate_limit is None else RateLimiter(rate_limit)
+        self.backend = backend
+        self.connection_kwargs = connection_kwargs
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = []
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = get_connection(self.backend, fail_silently=False, **self.connection_kwargs)
+            connection.open()
+            self._local.connection = connection
+            with self._lock:
+                self._opened.append(connection)
+        return connection
+
+    def _reset_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _send_one(self, msg):
+        try:
+            return self._connection().send_messages([msg])
+        except Exception:
+            # Соединение могло оборваться (таймаут сервера) — одна попытка на новом
+            self._reset_connection()
+            return self._connection().send_messages([msg])
+
+    def _send_batch(self, batch):
+        """batch — список (ключ, письмо). Возвращает (отправленные ключи, {ключ: ошибка}, BatchStats).
+
+        send_messages вызывается по письму на общем соединении: так ошибка одного
+        адресата не роняет пачку и не приводит к повторной отправке уже ушедших писем.
+        """
+        started = time.perf_counter()
+        sent, failed = [], {}
+        for key, msg in batch:
+            self.rate_limiter.acquire()
+            try:
+                if self._send_one(msg):
+                    sent.append(key)
+                else:
+                    failed[key] = 'письмо не принято бэкендом'
+            except Exception as e:
+                failed[key] = e
+                self._reset_connection()
+        stats = BatchStats(len(batch), len(sent), len(failed), time.perf_counter() - started)
+        logger.info('Пачка: %s писем, ошибок %s, %.1f писем/с', stats.size, stats.failed, stats.per_second)
+        return sent, failed, stats
+
+    def send(self, items):
+        """items — итерируемое (ключ, письмо), читается лениво: в памяти не больше
+        2 × connections пачек одновременно"""
+        report = DeliveryReport()
+        started = time.perf_counter()
+        items = iter(items)
+        in_flight = threading.BoundedSemaphore(self.connections * 2)
+
+        def collect(future):
+            try:
+                sent, failed, stats = future.result()
+                report.sent.extend(sent)
+                report.failed.update(failed)
+                report.batches.append(stats)
+            finally:
+                in_flight.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                while batch := list(islice(items, self.batch_size)):
+                    in_flight.acquire()
+                    pool.submit(self._send_batch, batch).add_done_callback(collect)
+        finally:
+            self.close()
+        report.seconds = time.perf_counter() - started
+        return report
+
+    def close(self):
+        with self._lock:
+            opened, self._opened = self._opened, []
+        for connection in opened:
+            try:
+                connection.close()
+            except Exception:
+                pass
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт сохранённых анонсов постов: после импорта в обход save() '
+            'или после изменения словаря цензора')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed = Post.objects.all().refresh_excerpts(options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Анонсы пересчитаны: изменено {changed} постов за {elapsed:.2f} с')
+        )
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from news.models import Post
+
+from .run_benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнение WSGI и ASGI при высокой конкурентности: синхронные представления в пуле потоков '
+            '(как у потокового WSGI-сервера) против асинхронных (NEWS_ASYNC_VIEWS) через ASGI-обработчик. '
+            'Каждый режим запускается в отдельном процессе; сеть не участвует — меряется сам Django.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('both', 'wsgi', 'asgi'), default='both')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--threads', type=int, default=8, help='Потоков WSGI-сервера')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Адреса по кругу (по умолчанию — список, поиск, пост, категории)')
+        parser.add_argument('--with-cache', action='store_true',
+                            help='Оставить кэш страниц (по умолчанию DummyCache — меряется работа с БД)')
+        parser.add_argument('--json', action='store_true', help='Вывести результат одной строкой JSON')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            results = [self.run_child(mode, options) for mode in ('wsgi', 'asgi')]
+            for result in results:
+                self.print_result(result)
+            return
+
+        post = Post.objects.order_by('-created_at').first()
+        if post is None:
+            raise CommandError('Нет данных: сначала запустите seed_benchmark_data')
+        paths = options['paths'] or [
+            '/news/', '/news/search/?q=' + post.title.split()[0], post.get_absolute_url(), '/news/categories/',
+        ]
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['with_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        with override_settings(**overrides):
+            run = self.run_wsgi if options['mode'] == 'wsgi' else self.run_asgi
+            # Прогрев: импорт шаблонов, соединения с БД
+            run(paths, len(paths) * 2, options)
+            timings, errors, elapsed = run(paths, options['requests'], options)
+
+        timings.sort()
+        result = {
+            'mode': options['mode'],
+            'async_views': settings.NEWS_ASYNC_VIEWS,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'] if options['mode'] == 'asgi' else options['threads'],
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'errors': errors,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+        else:
+            self.print_result(result)
+
+    def run_child(self, mode, options):
+        env = {**os.environ, 'NEWS_ASYNC_VIEWS': 'True' if mode == 'asgi' else 'False'}
+        command = [
+            sys.executable, sys.argv[0], 'bench_asgi', '--mode', mode, '--json',
+            '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+            '--threads', str(options['threads']),
+        ]
+        for path in options['paths'] or ():
+            command += ['--path', path]
+        if options['with_cache']:
+            command.append('--with-cache')
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def run_wsgi(self, paths, count, options):
+        """Пул потоков — как у потокового WSGI-сервера; у каждого потока свой клиент и соединение с БД"""
+        def worker(offset):
+            client = Client()
+            timings, errors = [], 0
+            for i in range(offset, count, options['threads']):
+                started = time.perf_counter()
+                response = client.get(paths[i % len(paths)])
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code != 200
+            return timings, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            parts = list(pool.map(worker, range(options['threads'])))
+        elapsed = time.perf_counter() - started
+        return [t for timings, _ in parts for t in timings], sum(e for _, e in parts), elapsed
+
+    def run_asgi(self, paths, count, options):
+        """concurrency одновременных запросов в одном цикле событий"""
+        async def main():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            timings, errors = [], 0
+
+            async def one(i):
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(paths[i % len(paths)])
+                    timings.append((time.perf_counter() - started) * 1000)
+                    errors += response.status_code != 200
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(count)))
+            return timings, errors, time.perf_counter() - started
+
+        return asyncio.run(main())
+
+    def print_result(self, result):
+        self.stdout.write(
+            f'{result["mode"].upper():<5} (async_views={result["async_views"]}, '
+            f'конкурентность {result["concurrency"]}): {result["rps"]:8.1f} запросов/с, '
+            f'p50 {result["p50_ms"]:8.2f} мс, p95 {result["p95_ms"]:8.2f} мс, p99 {result["p99_ms"]:8.2f} мс, '
+            f'ошибок {result["errors"]}'
+        )
@@ -0,0 +1,67 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.censor import CensorEngine
+from news.resources import CENSORED_WORDS
+
+
+def legacy_censor(text):
+    """Прежняя реализация фильтра censor — для сравнения"""
+    if not isinstance(text, str):
+        return text
+
+    for word in CENSORED_WORDS:
+        if len(word) <= 1:
+            continue
+
+        def replace_match(match):
+            matched_word = match.group()
+            return matched_word[0] + '*' * (len(matched_word) - 1)
+
+        pattern = re.compile(r'\b{}\b'.format(re.escape(word)), re.IGNORECASE)
+        text = pattern.sub(replace_match, text)
+
+    return text
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарк фильтра censor: прежняя реализация против CensorEngine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10, help='Строк на «страницу»')
+        parser.add_argument('--pages', type=int, default=500, help='Сколько раз отрисовать страницу')
+
+    def handle(self, *args, **options):
+        rows, pages = options['rows'], options['pages']
+        sample = ('Новость про редиску и дурак сказал бред, а потом чушь. ' * 4).strip()
+        # Заголовок и усечённый текст на каждую строку, как в news_list.html
+        page = [f'Заголовок {i}: гад и урод' for i in range(rows)] + [f'{sample} #{i}' for i in range(rows)]
+
+        def run(func):
+            started = time.perf_counter()
+            for _ in range(pages):
+                for text in page:
+                    func(text)
+            return time.perf_counter() - started
+
+        cold = CensorEngine(cache_size=0)
+        warm = CensorEngine()
+
+        for text in page:
+            if legacy_censor(text) != cold.censor(text):
+                self.stderr.write(f'Расхождение результатов: {text!r}')
+
+        results = [
+            ('legacy', run(legacy_censor)),
+            ('engine (без кэша)', run(cold.censor)),
+            ('engine (LRU)', run(warm.censor)),
+        ]
+        base = results[0][1]
+        calls = pages * len(page)
+        for name, elapsed in results:
+            self.stdout.write(
+                f'{name:<20} {elapsed * 1000:9.1f} мс  '
+                f'{elapsed / calls * 1e6:7.2f} мкс/вызов  x{base / elapsed:.1f}'
+            )
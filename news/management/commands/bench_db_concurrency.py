@@ -0,0 +1,108 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+
+from news.db_router import read_only
+from news.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк конкурентного доступа к базе: задержка чтения ленты без записи и под '
+            'параллельными записями (голоса, комментарии). Сравните запуск с DATABASE_PROFILE=production '
+            'и без него. Пишет в настроенную базу — запускайте на копии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, **options):
+        post = Post.objects.order_by('pk').select_related('author').first()
+        if post is None:
+            raise CommandError('Нужен хотя бы один пост (например, из seed-данных)')
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        self.stdout.write(f'Профиль: {settings.DATABASE_PROFILE}, journal_mode={journal_mode}, '
+                          f'соединения: {", ".join(settings.DATABASES)}')
+
+        for writers in (0, options['writers']):
+            result = self.run(post, options['readers'], writers, options['seconds'])
+            self.report(writers, result)
+
+        Comment.objects.filter(post=post, text__startswith='bench-').delete()
+
+    def run(self, post, readers, writers, seconds):
+        stop = threading.Event()
+        lock = threading.Lock()
+        result = {'latencies': [], 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+
+        def reader():
+            latencies, errors = [], 0
+            try:
+                with read_only():
+                    while not stop.is_set():
+                        started = time.perf_counter()
+                        try:
+                            list(Post.objects.for_list().order_by('-created_at')[:10])
+                        except OperationalError:
+                            errors += 1
+                            continue
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                result['latencies'].extend(latencies)
+                result['read_errors'] += errors
+
+        def writer(n):
+            writes, errors, i = 0, 0, 0
+            try:
+                while not stop.is_set():
+                    i += 1
+                    try:
+                        with transaction.atomic():
+                            Post.objects.filter(pk=post.pk).update(rating=F('rating') + 1)
+                            Comment.objects.bulk_create([
+                                Comment(post=post, user_id=post.author.user_id, text=f'bench-{n}-{i}')
+                            ])
+                            Post.objects.filter(pk=post.pk).update(rating=F('rating') - 1)
+                        writes += 1
+                    except OperationalError:
+                        errors += 1
+            finally:
+                connections.close_all()
+            with lock:
+                result['writes'] += writes
+                result['write_errors'] += errors
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        result['seconds'] = seconds
+        return result
+
+    def report(self, writers, result):
+        latencies = sorted(result['latencies'])
+        if not latencies:
+            self.stdout.write(f'Писателей {writers}: ни одного успешного чтения')
+            return
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0] * 1000
+        self.stdout.write(
+            f'Писателей {writers}: чтений {len(latencies) / result["seconds"]:.0f}/с, '
+            f'p50 {p50:.2f} мс, p95 {p95:.2f} мс, max {latencies[-1] * 1000:.2f} мс, '
+            f'ошибок чтения {result["read_errors"]}; '
+            f'записей {result["writes"] / result["seconds"]:.0f}/с, ошибок записи {result["write_errors"]}'
+        )
@@ -0,0 +1,72 @@
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from news.mailer import Mailer
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк доставки писем через локальный SMTP-приёмник aiosmtpd '
+            '(pip install aiosmtpd): по письму на соединение против news.mailer.Mailer')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--connections', type=int, default=4)
+        parser.add_argument('--rate-limit', type=float, default=0)
+        parser.add_argument('--port', type=int, default=8025)
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise CommandError('Для бенчмарка нужен aiosmtpd: pip install aiosmtpd')
+
+        handler = CountingHandler()
+        controller = Controller(handler, hostname='127.0.0.1', port=options['port'])
+        controller.start()
+        try:
+            backend_kwargs = {
+                'backend': 'django.core.mail.backends.smtp.EmailBackend',
+                'host': '127.0.0.1', 'port': options['port'],
+                'use_tls': False, 'use_ssl': False, 'username': '', 'password': '',
+            }
+            count = options['emails']
+
+            started = time.perf_counter()
+            for _, msg in self.messages(count):
+                msg.connection = get_connection(**backend_kwargs)
+                msg.send()
+            serial = time.perf_counter() - started
+            self.stdout.write(f'msg.send() по письму:    {count / serial:8.1f} писем/с ({serial:.2f} с)')
+
+            mailer = Mailer(batch_size=options['batch_size'], connections=options['connections'],
+                            rate_limit=options['rate_limit'], **backend_kwargs)
+            report = mailer.send(self.messages(count))
+            self.stdout.write(
+                f'Mailer ({options["connections"]} соед., пачка {options["batch_size"]}): '
+                f'{report.per_second:8.1f} писем/с ({report.seconds:.2f} с), ошибок: {len(report.failed)}'
+            )
+            worst = min(report.batches, key=lambda b: b.per_second)
+            self.stdout.write(f'Пачек: {len(report.batches)}, самая медленная: {worst.per_second:.1f} писем/с')
+            self.stdout.write(f'Принято приёмником: {handler.received}')
+        finally:
+            controller.stop()
+
+    def messages(self, count):
+        html = '<p>' + 'Текст письма. ' * 200 + '</p>'
+        for i in range(count):
+            msg = EmailMultiAlternatives('Бенчмарк', 'Текст письма. ' * 200,
+                                         'bench@example.com', [f'user{i}@example.com'])
+            msg.attach_alternative(html, 'text/html')
+            yield i, msg
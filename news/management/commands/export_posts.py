@@ -0,0 +1,31 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.transfer import FORMATS, detect_format, export_queryset, post_to_row, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Потоковый экспорт постов с категориями и комментариями в JSONL или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Файл или "-" для stdout')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию — по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['output'], options['format'])
+        rows = (post_to_row(post) for post in export_queryset(options['chunk_size']))
+        started = time.perf_counter()
+
+        if options['output'] == '-':
+            count = write_rows(sys.stdout, fmt, rows)
+            report = self.stderr
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+                count = write_rows(stream, fmt, rows)
+            report = self.stdout
+
+        elapsed = time.perf_counter() - started
+        report.write(f'Экспортировано постов: {count} за {elapsed:.2f} с ({count / elapsed if elapsed else 0:.0f} строк/с)')
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.transfer import FORMATS, PostImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Потоковый импорт постов с категориями и комментариями из JSONL или CSV пачками bulk_create. '
+            'Уведомления подписчикам не отправляются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл или "-" для stdin')
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию — по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['input'], options['format'])
+        importer = PostImporter()
+        started = time.perf_counter()
+
+        if options['input'] == '-':
+            self.run(importer, sys.stdin, fmt, options['chunk_size'], started)
+        else:
+            with open(options['input'], encoding='utf-8', newline='') as stream:
+                self.run(importer, stream, fmt, options['chunk_size'], started)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано постов: {importer.posts}, комментариев: {importer.comments} '
+            f'за {elapsed:.2f} с ({importer.posts / elapsed if elapsed else 0:.0f} строк/с)'
+        ))
+
+    def run(self, importer, stream, fmt, chunk_size, started):
+        done = 0
+        for count in importer.import_rows(read_rows(stream, fmt), chunk_size):
+            done += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {done} постов, {done / elapsed if elapsed else 0:.0f} строк/с')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from news.models import Post
+from news.search import fts_supported, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестроение полнотекстового индекса постов (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not fts_supported():
+            raise CommandError('Полнотекстовый индекс поддерживается только на SQLite')
+
+        started = time.perf_counter()
+        rebuild_index()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Индекс перестроен: {Post.objects.count()} постов за {elapsed:.2f} с')
+        )
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.models import Author
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт рейтинга всех авторов одним запросом (сверка инкрементального рейтинга)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = Author.objects.all().recompute_ratings()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Рейтинг пересчитан: {updated} авторов за {elapsed:.2f} с')
+        )
@@ -0,0 +1,190 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from news.models import Author, Category, Comment, Post
+
+
+def percentile(sorted_values, p):
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк основных страниц и еженедельной рассылки на текущих данных '
+            '(см. seed_benchmark_data): p50/p95/p99, запросы к БД на запрос, пик памяти. '
+            'Результат пишется в JSON для сравнения запусков между коммитами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30, help='Замеров на сценарий')
+        parser.add_argument('--digest-iterations', type=int, default=1)
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Не очищать кэш перед запросами (по умолчанию меряется работа без кэша)')
+        parser.add_argument('--only', nargs='*', help='Запустить только сценарии с этими именами')
+        parser.add_argument('--output', default='benchmarks/results.json',
+                            help='Куда записать JSON (путь по умолчанию исключён в .gitignore)')
+        parser.add_argument('--compare', help='JSON прошлого запуска: показать изменение p95')
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError('Нет данных: сначала запустите seed_benchmark_data')
+
+        self.options = options
+        # Тестовый клиент ходит на testserver, письма рассылки остаются в памяти
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                               EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            results = {}
+            for name, run in self.scenarios():
+                if options['only'] and name not in options['only']:
+                    continue
+                iterations = options['digest_iterations'] if name == 'weekly_digest' else options['iterations']
+                results[name] = self.measure(run, iterations)
+                self.print_result(name, results[name])
+
+        report = {
+            'commit': self.git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'warm_cache': options['warm_cache'],
+            'dataset': {
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'authors': Author.objects.count(),
+                'categories': Category.objects.count(),
+            },
+            'results': results,
+        }
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {output}'))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), report)
+
+    # ==================== СЦЕНАРИИ ====================
+
+    def scenarios(self):
+        client = Client()
+        post = Post.objects.order_by('-created_at').first()
+        author = Author.objects.order_by('pk').first()
+        category = Category.objects.order_by('pk').first()
+        word = post.title.split()[0]
+        week_ago = (timezone.now() - timedelta(days=7)).date().isoformat()
+        pages = max(1, Post.objects.count() // 10)
+        detail_pks = list(Post.objects.order_by('?').values_list('pk', 'post_type')[:50])
+
+        def get(url, params=None):
+            return lambda i: client.get(url, params or {})
+
+        def detail(i):
+            pk, post_type = detail_pks[i % len(detail_pks)]
+            name = 'news:news_detail' if post_type == 'NW' else 'articles:article_detail'
+            return client.get(reverse(name, args=[pk]))
+
+        def digest(i):
+            call_command('weekly_digest', stdout=StringIO())
+            mail.outbox = []
+
+        search = reverse('news:news_search')
+        return [
+            ('news_list', get(reverse('news:news_list'))),
+            ('news_list_deep_page', get(reverse('news:news_list'), {'page': pages // 2 or 1})),
+            ('news_list_cursor', get(reverse('news:news_list'), {'cursor': ''})),
+            ('search_fulltext', get(search, {'q': word})),
+            ('search_title', get(search, {'title': word})),
+            ('search_author', get(search, {'author': author.pk})),
+            ('search_created_at', get(search, {'created_at': week_ago})),
+            ('search_categories', get(search, {'categories': category.pk})),
+            ('post_detail', detail),
+            ('categories', get(reverse('news:category_list'))),
+            ('weekly_digest', digest),
+        ]
+
+    # ==================== ЗАМЕРЫ ====================
+
+    def measure(self, run, iterations):
+        """Тайминги без трассировки памяти; запросы и пик памяти — отдельным прогоном"""
+        timings = []
+        for i in range(iterations):
+            if not self.options['warm_cache']:
+                cache.clear()
+            started = time.perf_counter()
+            response = run(i)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response is not None and response.status_code != 200:
+                raise CommandError(f'Ответ {response.status_code} вместо 200')
+
+        if not self.options['warm_cache']:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                run(0)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'iterations': iterations,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': len(ctx.captured_queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    # ==================== ОТЧЁТ ====================
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f'{name:<22} p50 {result["p50_ms"]:8.2f} мс  p95 {result["p95_ms"]:8.2f} мс  '
+            f'p99 {result["p99_ms"]:8.2f} мс  запросов {result["queries"]:3}  '
+            f'память {result["peak_memory_kb"]:9.1f} КБ'
+        )
+
+    def compare(self, previous, current):
+        self.stdout.write(f'Сравнение p95 с {previous.get("commit") or "прошлым запуском"}:')
+        for name, result in current['results'].items():
+            before = previous.get('results', {}).get(name)
+            if not before or not before['p95_ms']:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            self.stdout.write(
+                f'{name:<22} {before["p95_ms"]:8.2f} → {result["p95_ms"]:8.2f} мс ({change:+.1f}%), '
+                f'запросов {before["queries"]} → {result["queries"]}'
+            )
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
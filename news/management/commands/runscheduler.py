@@ -0,0 +1,50 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from news.scheduler import acquire_lease, create_scheduler, make_holder_id, release_lease
+
+
+class Command(BaseCommand):
+    help = ('Отдельный процесс планировщика (еженедельная рассылка и др.). '
+            'Можно запускать на нескольких узлах: задачи выполняет только держатель аренды в БД')
+
+    def handle(self, *args, **options):
+        ttl = settings.SCHEDULER_LEASE_SECONDS
+        holder = make_holder_id()
+        stop = threading.Event()
+        scheduler = None
+
+        self.stdout.write(f"Планировщик {holder}: ожидание лидерства (аренда {ttl} с)")
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    is_leader = acquire_lease(holder, ttl)
+                    if is_leader and scheduler is None:
+                        scheduler = create_scheduler()
+                        scheduler.start()
+                        self.stdout.write(self.style.SUCCESS("Лидерство получено, планировщик запущен"))
+                except DatabaseError as exc:
+                    # Например, «database is locked»: без аренды лидером себя не считаем,
+                    # повторяем на следующем такте, а не роняем процесс
+                    self.stderr.write(f"Аренда недоступна: {exc}")
+                    is_leader = False
+
+                if not is_leader and scheduler is not None:
+                    # Аренду перехватили (например, процесс долго стоял) или не удалось продлить — уступаем
+                    scheduler.shutdown(wait=False)
+                    scheduler = None
+                    self.stderr.write("Лидерство потеряно, планировщик остановлен")
+
+                # Продлеваем с запасом: три попытки до истечения аренды
+                stop.wait(ttl / 3)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if scheduler is not None:
+                scheduler.shutdown()
+                release_lease(holder)
+            self.stdout.write("Планировщик остановлен")
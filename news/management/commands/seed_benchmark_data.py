@@ -0,0 +1,146 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from news.caching import invalidate_categories_navigation
+from news.censor import censor
+from news.models import Author, Category, Comment, Post, PostCategory, make_excerpt
+from news.page_cache import CATEGORIES, LIST, bump_versions
+from news.resources import POST_TYPES
+
+
+class Command(BaseCommand):
+    help = ('Синтетические данные для бенчмарков (Faker): пользователи, авторы, категории, посты, '
+            'связи с категориями, комментарии и подписки — пачками через bulk_create')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--categories-per-post', type=int, default=2)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--subscriptions-per-user', type=int, default=3)
+        parser.add_argument('--days', type=int, default=60, help='Разброс дат постов в прошлое')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--locale', default='ru_RU')
+
+    def handle(self, *args, **options):
+        try:
+            from faker import Faker
+        except ImportError:
+            raise CommandError('Нужен Faker: pip install Faker')
+        if options['authors'] > options['users']:
+            raise CommandError('--authors не может быть больше --users')
+
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker(options['locale'])
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            authors = Author.objects.bulk_create(
+                [Author(user=user) for user in users[:options['authors']]], batch_size=self.batch_size
+            )
+            categories = self.create_categories(options['categories'])
+            posts = self.create_posts(authors, options['posts'], options['days'])
+            self.link_categories(posts, categories, options['categories_per_post'])
+            self.create_comments(posts, users, options['comments'])
+            self.subscribe(users, categories, options['subscriptions_per_user'])
+            Author.objects.filter(pk__in=[a.pk for a in authors]).recompute_ratings()
+
+        # bulk_create не шлёт сигналы: сбрасываем кэши, которые они бы сбросили
+        bump_versions(LIST, CATEGORIES)
+        invalidate_categories_navigation()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, авторов {len(authors)}, категорий {len(categories)}, '
+            f'постов {len(posts)}, комментариев {options["comments"]} за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def batched(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def create_users(self, count):
+        start = User.objects.count()
+        # Хэш пароля считается один раз: make_password на каждого занял бы минуты
+        password = make_password('benchmark')
+        return self.batched(User, [
+            User(
+                username=f'bench{start + i}',
+                email=f'bench{start + i}@example.com',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=password,
+            )
+            for i in range(count)
+        ])
+
+    def create_categories(self, count):
+        start = Category.objects.count()
+        return self.batched(Category, [
+            Category(name=f'{self.fake.word().capitalize()} {start + i}') for i in range(count)
+        ])
+
+    def create_posts(self, authors, count, days):
+        # Тексты генерируются пулом и переиспользуются: Faker на каждый пост — узкое место
+        titles = [self.fake.sentence(nb_words=6).rstrip('.') for _ in range(min(count, 500))]
+        texts = [self.fake.text(max_nb_chars=1500) for _ in range(min(count, 200))]
+        # bulk_create не вызывает save(): анонс считаем сами, по разу на текст
+        excerpts = {text: make_excerpt(text) for text in texts}
+        post_types = [code for code, _ in POST_TYPES]
+        posts = self.batched(Post, [
+            Post(
+                author=self.rng.choice(authors),
+                post_type=self.rng.choice(post_types),
+                title=self.rng.choice(titles),
+                content=text,
+                excerpt=excerpts[text],
+                excerpt_censored=censor(excerpts[text]),
+                rating=self.rng.randint(-5, 50),
+            )
+            for text in (self.rng.choice(texts) for _ in range(count))
+        ])
+        # created_at с auto_now_add не задать в bulk_create, поэтому разносим даты отдельным UPDATE
+        now = timezone.now()
+        for post in posts:
+            post.created_at = now - timedelta(seconds=self.rng.randint(0, days * 24 * 3600))
+        Post.objects.bulk_update(posts, ['created_at'], batch_size=self.batch_size // 4 or 1)
+        return posts
+
+    def link_categories(self, posts, categories, per_post):
+        per_post = min(per_post, len(categories))
+        links = (
+            PostCategory(post=post, category=category)
+            for post in posts for category in self.rng.sample(categories, per_post)
+        )
+        self.batched(PostCategory, list(links))
+
+    def create_comments(self, posts, users, count):
+        texts = [self.fake.sentence(nb_words=12) for _ in range(min(count, 300))]
+        self.batched(Comment, [
+            Comment(
+                post=self.rng.choice(posts),
+                user=self.rng.choice(users),
+                text=self.rng.choice(texts),
+                rating=self.rng.randint(-2, 10),
+            )
+            for _ in range(count)
+        ])
+
+    def subscribe(self, users, categories, per_user):
+        per_user = min(per_user, len(categories))
+        Subscription = Category.subscribers.through
+        self.batched(Subscription, [
+            Subscription(category=category, user=user)
+            for user in users for category in self.rng.sample(categories, per_user)
+        ])
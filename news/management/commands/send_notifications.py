@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from news.notifications import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Рассылка уведомлений о новых постах из outbox пулом воркеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Размер пула воркеров')
+        parser.add_argument('--batch-size', type=int, default=100, help='Строк outbox за один захват')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Пауза, когда outbox пуст (сек)')
+        parser.add_argument('--once', action='store_true', help='Разобрать outbox и выйти')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.sent = self.failed = 0
+
+        self.stdout.write(f"Воркеров: {options['workers']}, пачка: {options['batch_size']}")
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [
+                pool.submit(self.worker, options['batch_size'], options['poll_interval'], options['once'])
+                for _ in range(options['workers'])
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                self.stop.set()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Отправлено писем: {self.sent}, ошибок: {self.failed}')
+        )
+
+    def worker(self, batch_size, poll_interval, once):
+        try:
+            while not self.stop.is_set():
+                sent, failed = process_batch(batch_size)
+                with self.lock:
+                    self.sent += sent
+                    self.failed += failed
+                if sent or failed:
+                    continue
+                if once:
+                    return
+                self.stop.wait(poll_interval)
+        finally:
+            connection.close()
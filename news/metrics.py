@@ -0,0 +1,283 @@
+import heapq
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (секунды) и числа запросов к БД
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+PHASES = ('total', 'sql', 'template', 'censor')
+# Сколько тяжёлых запросов к БД держать на запрос для журнала медленных
+HEAVIEST_QUERIES = 5
+
+
+# ==================== ЗАМЕРЫ ЗАПРОСА ====================
+
+class RequestStats:
+    """Счётчики одного HTTP-запроса; миллисекунды"""
+    __slots__ = ('queries', 'sql_ms', 'template_ms', 'censor_ms', 'heaviest', 'template_started')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.censor_ms = 0.0
+        self.heaviest = []  # куча (мс, sql) из HEAVIEST_QUERIES самых долгих
+        self.template_started = None
+
+    def add_query(self, sql, ms):
+        self.queries += 1
+        self.sql_ms += ms
+        if len(self.heaviest) < HEAVIEST_QUERIES:
+            heapq.heappush(self.heaviest, (ms, sql))
+        elif ms > self.heaviest[0][0]:
+            heapq.heapreplace(self.heaviest, (ms, sql))
+
+
+_stats = ContextVar('news_request_stats', default=None)
+
+
+def sql_timer(execute, sql, params, many, context):
+    """execute_wrapper: вне замеряемого запроса (команды, планировщик) — только вызов"""
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def _install_on(connection, **kwargs):
+    # connection_created срабатывает на каждое переподключение, обёртка нужна одна
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
+
+
+def install_sql_timer():
+    """Обёртка ставится на соединения всех потоков — в том числе на потоки sync_to_async,
+    в которых async ORM выполняет запросы; ContextVar доходит туда вместе с контекстом"""
+    connection_created.connect(_install_on, dispatch_uid='news_metrics_sql_timer')
+    for connection in connections.all(initialized_only=True):
+        _install_on(connection)
+
+
+@contextmanager
+def censor_timer():
+    stats = _stats.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.censor_ms += (time.perf_counter() - started) * 1000
+
+
+# ==================== ГИСТОГРАММЫ ====================
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Гистограммы по имени URL с начала работы процесса и окно последних window
+    длительностей для квантилей. Счётчики у каждого процесса свои: Prometheus
+    собирает их с каждого воркера и считает скорость сам (rate/histogram_quantile)."""
+
+    def __init__(self, window=None):
+        self.window = window or getattr(settings, 'METRICS_WINDOW', 1000)
+        self._lock = threading.Lock()
+        self._seconds = defaultdict(lambda: Histogram(SECONDS_BUCKETS))  # (view, phase)
+        self._queries = defaultdict(lambda: Histogram(QUERIES_BUCKETS))  # view
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))  # view
+        self._statuses = defaultdict(int)  # (view, класс статуса)
+
+    def observe(self, view, status, total_ms, stats):
+        seconds = (total_ms, stats.sql_ms, stats.template_ms, stats.censor_ms)
+        with self._lock:
+            for phase, ms in zip(PHASES, seconds):
+                self._seconds[(view, phase)].observe(ms / 1000)
+            self._queries[view].observe(stats.queries)
+            self._recent[view].append(total_ms / 1000)
+            self._statuses[(view, f'{status // 100}xx')] += 1
+
+    def reset(self):
+        with self._lock:
+            self._seconds.clear()
+            self._queries.clear()
+            self._recent.clear()
+            self._statuses.clear()
+
+    def quantiles(self, view, qs=(0.5, 0.95, 0.99)):
+        with self._lock:
+            values = sorted(self._recent.get(view, ()))
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in qs}
+
+    def render(self):
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        with self._lock:
+            seconds = {key: (h.counts[:], h.sum, h.count) for key, h in self._seconds.items()}
+            queries = {key: (h.counts[:], h.sum, h.count) for key, h in self._queries.items()}
+            statuses = dict(self._statuses)
+            views = list(self._recent)
+
+        lines = [
+            '# HELP news_request_seconds Время обработки запроса по фазам',
+            '# TYPE news_request_seconds histogram',
+        ]
+        for (view, phase), data in sorted(seconds.items()):
+            lines += _histogram_lines('news_request_seconds', f'view="{view}",phase="{phase}"', SECONDS_BUCKETS, *data)
+
+        lines += [
+            '# HELP news_request_queries Число SQL-запросов на HTTP-запрос',
+            '# TYPE news_request_queries histogram',
+        ]
+        for view, data in sorted(queries.items()):
+            lines += _histogram_lines('news_request_queries', f'view="{view}"', QUERIES_BUCKETS, *data)
+
+        lines += [
+            f'# HELP news_request_recent_seconds Квантили времени по последним {self.window} запросам',
+            '# TYPE news_request_recent_seconds summary',
+        ]
+        for view in sorted(views):
+            for q, value in self.quantiles(view).items():
+                lines.append(f'news_request_recent_seconds{{view="{view}",quantile="{q}"}} {value:.6f}')
+
+        lines += [
+            '# HELP news_requests_total Ответы по классу статуса',
+            '# TYPE news_requests_total counter',
+        ]
+        for (view, status), count in sorted(statuses.items()):
+            lines.append(f'news_requests_total{{view="{view}",status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name, labels, buckets, counts, total, count):
+    lines, cumulative = [], 0
+    for bound, bucket_count in zip((*buckets, '+Inf'), counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {count}')
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+# ==================== MIDDLEWARE ====================
+
+def view_label(request):
+    """Имя URL, а не путь: у гистограмм не должно быть метки на каждый pk"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def server_timing(stats, total_ms):
+    return ', '.join((
+        f'db;dur={stats.sql_ms:.1f};desc="{stats.queries} queries"',
+        f'tpl;dur={stats.template_ms:.1f}',
+        f'censor;dur={stats.censor_ms:.1f}',
+        f'total;dur={total_ms:.1f}',
+    ))
+
+
+def log_if_slow(request, view, total_ms, stats):
+    if total_ms < getattr(settings, 'SLOW_REQUEST_MS', 500):
+        return
+    if random.random() >= getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 1.0):
+        return
+    heaviest = '\n'.join(f'  {ms:8.1f} мс  {sql[:500]}' for ms, sql in sorted(stats.heaviest, reverse=True))
+    logger.warning(
+        'Медленный запрос %s %s (%s): %.0f мс, SQL %d за %.0f мс, шаблон %.0f мс, цензор %.0f мс\n%s',
+        request.method, request.get_full_path(), view, total_ms,
+        stats.queries, stats.sql_ms, stats.template_ms, stats.censor_ms, heaviest,
+    )
+
+
+class RequestMetricsMiddleware:
+    """Число и время SQL, время шаблона и цензора, общее время каждого запроса.
+
+    Результат — гистограммы для /metrics, журнал медленных запросов с самыми тяжёлыми
+    SQL и, если включён METRICS_SERVER_TIMING, заголовок Server-Timing. Тело
+    StreamingHttpResponse (ленты) отдаётся после замера и в него не входит.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_sql_timer()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def start(self):
+        stats = RequestStats()
+        return stats, _stats.set(stats), time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Вызывается прямо перед response.render(); конец рендера отмечает callback
+        stats = _stats.get()
+        if stats is not None:
+            stats.template_started = time.perf_counter()
+            response.add_post_render_callback(lambda r: self.template_rendered(stats))
+        return response
+
+    @staticmethod
+    def template_rendered(stats):
+        stats.template_ms += (time.perf_counter() - stats.template_started) * 1000
+
+    def finish(self, request, response, stats, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        view = view_label(request)
+        registry.observe(view, response.status_code, total_ms, stats)
+        if getattr(settings, 'METRICS_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = server_timing(stats, total_ms)
+        log_if_slow(request, view, total_ms, stats)
+        return response
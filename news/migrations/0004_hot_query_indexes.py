@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0003_schedulerlease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['post_type', '-created_at'], name='post_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_at'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcategory',
+            index=models.Index(fields=['category', 'post'], name='postcategory_category_post_idx'),
+        ),
+    ]
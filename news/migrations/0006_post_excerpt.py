@@ -0,0 +1,55 @@
+import re
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+# Копии make_excerpt и словаря цензора на момент миграции: живой код из news сюда не импортируется.
+# Позже словарь может измениться — тогда анонсы пересчитывает manage.py backfill_excerpts
+EXCERPT_WORDS = 20
+CENSORED_WORDS = [
+    'редиска', 'дурак', 'тупой', 'идиот', 'мудак', 'чушь', 'бред', 'придурок', 'нахрен', 'хрен',
+    'бля', 'ебать', 'сука', 'паскуда', 'гад', 'козёл', 'сволочь', 'урод', 'говно', 'отстой',
+]
+# Как в CensorEngine: длинные слова первыми, у совпадения остаётся первая буква
+CENSOR_PATTERN = re.compile(
+    r'\b(?:{})\b'.format('|'.join(re.escape(w) for w in sorted(CENSORED_WORDS, key=len, reverse=True))),
+    re.IGNORECASE,
+)
+
+
+def censor(text):
+    return CENSOR_PATTERN.sub(lambda match: match.group()[0] + '*' * (len(match.group()) - 1), text)
+
+
+def fill_excerpts(apps, schema_editor):
+    Post = apps.get_model('news', 'Post')
+    posts = []
+    for post in Post.objects.only('pk', 'content').iterator(chunk_size=1000):
+        post.excerpt = Truncator(post.content).words(EXCERPT_WORDS, truncate=' …')
+        post.excerpt_censored = censor(post.excerpt)
+        posts.append(post)
+        if len(posts) >= 1000:
+            Post.objects.bulk_update(posts, ['excerpt', 'excerpt_censored'])
+            posts = []
+    Post.objects.bulk_update(posts, ['excerpt', 'excerpt_censored'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_censored',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0007_post_updated_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_author_created_idx',
+        ),
+    ]
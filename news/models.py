@@ -1,8 +1,85 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from news.censor import censor
 from news.resources import POST_TYPES
+from news.page_cache import LIST, bump_versions, post_scope
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import Truncator
+
+
+def increment_ratings(queryset, deltas, field='pk', batch_size=500, **extra):
+    """UPDATE ... SET rating = rating + CASE <field> WHEN ... END — только rating и колонки из extra"""
+    keys = [key for key, delta in deltas.items() if delta]
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+        increment = Case(
+            *[When(**{field: key}, then=Value(deltas[key])) for key in chunk],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        queryset.filter(**{f'{field}__in': chunk}).update(rating=F('rating') + increment, **extra)
+
+
+def shift_author_ratings(author_deltas, user_deltas=None, batch_size=500):
+    increment_ratings(Author.objects.all(), author_deltas, batch_size=batch_size)
+    increment_ratings(Author.objects.all(), user_deltas or {}, field='user_id', batch_size=batch_size)
+
+
+class VotableMixin:
+    """Атомарное изменение рейтинга: UPDATE только колонки rating, без гонок.
+
+    Вместе с рейтингом объекта на ту же дельту сдвигается рейтинг авторов
+    (см. author_rating_deltas), так что Author.rating не нужно пересчитывать.
+    """
+
+    @classmethod
+    def apply_rating_deltas(cls, deltas, batch_size=500):
+        with transaction.atomic():
+            increment_ratings(cls.objects.all(), deltas, batch_size=batch_size, **cls.rating_update_extra())
+            post_ids = cls.touch_posts(list(deltas))
+            shift_author_ratings(*cls.author_rating_deltas(deltas), batch_size=batch_size)
+        # Кэш страниц хранит ETag вместе со страницей — он должен смениться вместе с updated_at
+        bump_versions(*(post_scope(pk) for pk in post_ids))
+
+    @classmethod
+    def rating_update_extra(cls):
+        """Колонки, которые меняются в том же UPDATE, что и рейтинг"""
+        return {}
+
+    @classmethod
+    def touch_posts(cls, pks):
+        """Сдвигает Post.updated_at постов, страницы которых показывают эти объекты. Возвращает их pk"""
+        return []
+
+    @classmethod
+    def author_rating_deltas(cls, deltas):
+        """{pk: дельта} -> ({author_id: дельта}, {user_id: дельта}); по умолчанию авторы не меняются"""
+        return {}, {}
+
+    def save(self, *args, **kwargs):
+        # rating меняет только apply_rating_deltas — атомарным UPDATE вместе с рейтингом авторов.
+        # Обычное сохранение (форма, админка) записало бы устаревшее значение и потеряло голоса
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'rating']
+        super().save(*args, **kwargs)
+
+    def vote(self, delta):
+        self.apply_rating_deltas({self.pk: delta})
+        self.refresh_from_db(fields=['rating'])
+
+    def like(self):
+        self.vote(1)
+
+    def dislike(self):
+        self.vote(-1)
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -16,46 +93,131 @@ class Category(models.Model):
         return self.name
 
 
+class AuthorQuerySet(models.QuerySet):
+    def recompute_ratings(self):
+        """Пересчёт рейтинга одним UPDATE:
+        3 × рейтинг постов + рейтинг своих комментариев + рейтинг комментариев к своим постам
+        """
+        def total(queryset, group_by):
+            return Coalesce(
+                Subquery(queryset.values(group_by).annotate(total=Sum('rating')).values('total')),
+                Value(0),
+            )
+
+        return self.update(rating=(
+            total(Post.objects.filter(author=OuterRef('pk')), 'author') * 3
+            + total(Comment.objects.filter(user=OuterRef('user')), 'user')
+            + total(Comment.objects.filter(post__author=OuterRef('pk')), 'post__author')
+        ))
+
+
 class Author(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     rating = models.IntegerField(default=0)
 
+    objects = AuthorQuerySet.as_manager()
+
     def update_rating(self):
-        from .models import Comment
+        Author.objects.filter(pk=self.pk).recompute_ratings()
+        self.refresh_from_db(fields=['rating'])
 
-        post_rating = self.post_set.aggregate(pr=Sum('rating'))['pr'] or 0
-        post_rating *= 3
+    def __str__(self):
+        return f'{self.user.username} (rating: {self.rating})'
 
-        comment_rating = self.user.comment_set.aggregate(cr=Sum('rating'))['cr'] or 0
 
-        post_comment_rating = Comment.objects.filter(post__author=self).aggregate(pcr=Sum('rating'))['pcr'] or 0
+# Длина сохранённого анонса поста в словах (как truncatewords:20 в списках)
+EXCERPT_WORDS = 20
 
-        self.rating = post_rating + comment_rating + post_comment_rating
-        self.save()
 
-    def __str__(self):
-        return f'{self.user.username} (rating: {self.rating})'
+def make_excerpt(content):
+    return Truncator(content).words(EXCERPT_WORDS, truncate=' …')
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def for_list(self):
+        """Всё, что нужно спискам постов, за фиксированное число запросов.
+        Полный текст не читается — спискам хватает сохранённого анонса"""
+        return self.select_related('author__user').prefetch_related('categories').defer('content')
+
+    def refresh_excerpts(self, chunk_size=1000):
+        """Пересчитывает анонсы (после bulk_create в обход save() или смены словаря цензора).
+        Пишет только изменившиеся строки; возвращает их число"""
+        fields = ('pk', 'content', 'excerpt', 'excerpt_censored')
+        changed, last_pk = 0, 0
+        while True:
+            chunk = list(self.filter(pk__gt=last_pk).order_by('pk').only(*fields)[:chunk_size])
+            if not chunk:
+                return changed
+            last_pk = chunk[-1].pk
+            stale = []
+            for post in chunk:
+                old = (post.excerpt, post.excerpt_censored)
+                post.refresh_excerpt()
+                if (post.excerpt, post.excerpt_censored) != old:
+                    stale.append(post)
+            if stale:
+                Post.objects.bulk_update(stale, ['excerpt', 'excerpt_censored'])
+                bump_versions(LIST, *(post_scope(post.pk) for post in stale))
+                changed += len(stale)
+
+    def touch(self):
+        """Меняет валидатор (updated_at) без сохранения объектов"""
+        return self.update(updated_at=timezone.now())
+
+
+class Post(VotableMixin, models.Model):
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
     post_type = models.CharField(max_length=2, choices=POST_TYPES)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Для ETag страницы поста и Last-Modified лент: меняется при правке, голосах, комментариях и смене категорий
+    updated_at = models.DateTimeField(auto_now=True)
     title = models.CharField(max_length=255)
     content = models.TextField()
+    # Анонс для списков, поиска, лент и рассылок — считается в save(), чтобы им не читать content
+    excerpt = models.TextField(blank=True, default='', editable=False)
+    excerpt_censored = models.TextField(blank=True, default='', editable=False)
     rating = models.IntegerField(default=0)
     categories = models.ManyToManyField(Category, through='PostCategory', related_name='posts')
 
-    def like(self):
-        self.rating += 1
-        self.save()
+    objects = PostQuerySet.as_manager()
 
-    def dislike(self):
-        self.rating -= 1
-        self.save()
+    class Meta:
+        indexes = [
+            # Ленты: все посты и по типу, новые сверху
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            models.Index(fields=['post_type', '-created_at'], name='post_type_created_idx'),
+            # Last-Modified лент: Max(updated_at)
+            models.Index(fields=['updated_at'], name='post_updated_idx'),
+        ]
 
-    def preview(self):
-        return self.content[:124] + '...' if len(self.content) > 124 else self.content
+    @classmethod
+    def author_rating_deltas(cls, deltas):
+        author_deltas = {}
+        for pk, author_id in cls.objects.filter(pk__in=list(deltas)).values_list('pk', 'author_id'):
+            author_deltas[author_id] = author_deltas.get(author_id, 0) + 3 * deltas[pk]
+        return author_deltas, {}
+
+    @classmethod
+    def rating_update_extra(cls):
+        return {'updated_at': timezone.now()}
+
+    @classmethod
+    def touch_posts(cls, pks):
+        # updated_at уже сдвинут тем же UPDATE, что и рейтинг
+        return pks
+
+    def refresh_excerpt(self):
+        self.excerpt = make_excerpt(self.content)
+        self.excerpt_censored = censor(self.excerpt)
+
+    def save(self, *args, **kwargs):
+        # Пост, загруженный без content, анонс не меняет
+        if 'content' not in self.get_deferred_fields():
+            self.refresh_excerpt()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'excerpt', 'excerpt_censored'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.title} ({self.get_post_type_display()}, автор: {self.author.user.username})'
@@ -72,27 +234,80 @@ class PostCategory(models.Model):
 
     class Meta:
         unique_together = [['post', 'category']]
+        # Посты категории (дайджест, страница категорий) без обращения к таблице связей
+        indexes = [models.Index(fields=['category', 'post'], name='postcategory_category_post_idx')]
 
 
-class Comment(models.Model):
+class Comment(VotableMixin, models.Model):
     post = models.ForeignKey('Post', on_delete=models.CASCADE)  # Используем строковую ссылку
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     rating = models.IntegerField(default=0)
 
-    def like(self):
-        self.rating += 1
-        self.save()
+    @classmethod
+    def author_rating_deltas(cls, deltas):
+        author_deltas, user_deltas = {}, {}
+        rows = cls.objects.filter(pk__in=list(deltas)).values_list('pk', 'user_id', 'post__author_id')
+        for pk, user_id, post_author_id in rows:
+            user_deltas[user_id] = user_deltas.get(user_id, 0) + deltas[pk]
+            author_deltas[post_author_id] = author_deltas.get(post_author_id, 0) + deltas[pk]
+        return author_deltas, user_deltas
 
-    def dislike(self):
-        self.rating -= 1
-        self.save()
+    @classmethod
+    def touch_posts(cls, pks):
+        post_ids = list(cls.objects.filter(pk__in=pks).values_list('post_id', flat=True).distinct())
+        Post.objects.filter(pk__in=post_ids).touch()
+        return post_ids
 
     def __str__(self):
         return f'Комментарий от {self.user.username} к посту "{self.post.title}"'
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['post', '-created_at'], name='comment_post_created_idx')]
 
 
+
+
+class PostNotification(models.Model):
+    """Outbox уведомлений о новых постах: одна строка (и одно письмо) на пользователя и пост"""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='notifications')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [['post', 'recipient']]
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f'{self.recipient} ← {self.post_id} ({self.get_status_display()})'
+
+
+class SchedulerLease(models.Model):
+    """Аренда лидерства планировщика: задачи выполняет только держатель непросроченной аренды"""
+    name = models.CharField(max_length=100, unique=True)
+    holder = models.CharField(max_length=255)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name}: {self.holder} до {self.expires_at}'
@@ -0,0 +1,185 @@
+import logging
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db.models import Q, Subquery
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .mailer import Mailer
+from .models import Category, PostNotification
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+RETRY_BASE_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 30)
+# Через сколько «зависшая» в статусе sending строка снова доступна воркерам
+LEASE_SECONDS = getattr(settings, 'NOTIFICATION_LEASE_SECONDS', 300)
+
+
+# ==================== ПОСТАНОВКА В OUTBOX ====================
+
+_suspended = ContextVar('news_notifications_suspended', default=False)
+
+
+@contextmanager
+def suspend_notifications():
+    """Сигналы не ставят письма в outbox внутри блока — для массового импорта архива"""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def notifications_suspended():
+    return _suspended.get()
+
+
+def enqueue_post_notifications(post_id, category_ids, chunk_size=1000):
+    """Кладёт в outbox по строке на подписчика категорий поста.
+
+    Вызывается в транзакции добавления категорий, так что outbox фиксируется
+    вместе с постом. Пользователь, подписанный на несколько категорий поста,
+    получит одно письмо: повторы отсекает unique (post, recipient).
+    """
+    subscriptions = (
+        Category.subscribers.through.objects
+        .filter(category_id__in=category_ids)
+        .exclude(user__email='')
+        .order_by('user_id', 'category_id')
+        .values_list('user_id', 'category_id')
+    )
+
+    batch, last_user_id = [], None
+    for user_id, category_id in subscriptions.iterator(chunk_size=chunk_size):
+        if user_id == last_user_id:
+            continue
+        last_user_id = user_id
+        batch.append(PostNotification(post_id=post_id, recipient_id=user_id, category_id=category_id))
+        if len(batch) >= chunk_size:
+            PostNotification.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        PostNotification.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+# ==================== ДОСТАВКА ====================
+
+def claim_batch(worker_id, size):
+    """Забирает до size готовых к отправке строк под worker_id"""
+    now = timezone.now()
+    claimable = (
+        Q(status=PostNotification.PENDING, next_attempt_at__lte=now)
+        | Q(status=PostNotification.SENDING, locked_at__lt=now - timedelta(seconds=LEASE_SECONDS))
+    )
+    # Один UPDATE ... WHERE pk IN (SELECT ... LIMIT n): без отдельного чтения,
+    # которое в SQLite пришлось бы повышать до записи под конкурентными воркерами
+    candidates = (
+        PostNotification.objects.filter(claimable)
+        .order_by('next_attempt_at', 'pk')
+        .values('pk')[:size]
+    )
+    claimed = PostNotification.objects.filter(claimable, pk__in=Subquery(candidates)).update(
+        status=PostNotification.SENDING, locked_by=worker_id, locked_at=now,
+    )
+    if not claimed:
+        return []
+    return list(
+        PostNotification.objects
+        .filter(locked_by=worker_id, status=PostNotification.SENDING)
+        .select_related('post', 'recipient', 'category')
+    )
+
+
+def build_message(post, category, post_url, preview, html_content, recipient):
+    category_name = category.name if category else ''
+    subject = f'Новость в категории «{category_name}»: {post.title}'
+
+    text_content = f"""
+Здравствуйте!
+
+В вашей любимой категории «{category_name}» появилась новая статья:
+{post.title}
+
+Краткое содержание:
+{preview}
+
+Читать полностью: {post_url}
+
+Это автоматическое письмо. Пожалуйста, не отвечайте на него.
+"""
+
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=text_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient.email]
+    )
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def render_notification_html(post, category, post_url, preview):
+    return render_to_string(
+        'email/new_post_notification.html',
+        {
+            'category': category,
+            'post': post,
+            'preview': preview,
+            'post_url': post_url,
+        }
+    )
+
+
+def deliver(notifications):
+    """Отправляет забранные строки и отмечает результат. Возвращает (отправлено, ошибок)"""
+    rendered = {}  # письмо рендерится один раз на пост и категорию
+
+    def messages():
+        for notification in notifications:
+            post, category = notification.post, notification.category
+            key = (post.pk, notification.category_id)
+            if key not in rendered:
+                post_url = f"{settings.SITE_URL}{post.get_absolute_url()}"
+                preview = post.content[:50] + '...' if len(post.content) > 50 else post.content
+                html_content = render_notification_html(post, category, post_url, preview)
+                rendered[key] = (post_url, preview, html_content)
+            yield notification, build_message(post, category, *rendered[key], notification.recipient)
+
+    # Параллельность даёт пул воркеров send_notifications, здесь одно соединение на пачку.
+    # Лимит EMAIL_RATE_LIMIT общий на процесс (shared_rate_limiter), а не свой у каждой пачки
+    report = Mailer(batch_size=len(notifications), connections=1).send(messages())
+
+    PostNotification.objects.filter(pk__in=[n.pk for n in report.sent]).update(
+        status=PostNotification.SENT, sent_at=timezone.now(), locked_by='', last_error='',
+    )
+    for notification, error in report.failed.items():
+        mark_failed(notification, error)
+    return len(report.sent), len(report.failed)
+
+
+def mark_failed(notification, error):
+    attempts = notification.attempts + 1
+    logger.warning('Ошибка отправки %s (попытка %s): %s', notification.recipient.email, attempts, error)
+    if attempts >= MAX_ATTEMPTS:
+        status, next_attempt_at = PostNotification.FAILED, timezone.now()
+    else:
+        status = PostNotification.PENDING
+        next_attempt_at = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    PostNotification.objects.filter(pk=notification.pk).update(
+        status=status, attempts=attempts, next_attempt_at=next_attempt_at,
+        locked_by='', last_error=str(error)[:1000],
+    )
+
+
+def process_batch(size=100):
+    """Один цикл воркера: забрать пачку и отправить. Возвращает (отправлено, ошибок)"""
+    notifications = claim_batch(uuid.uuid4().hex, size)
+    if not notifications:
+        return 0, 0
+    return deliver(notifications)
@@ -0,0 +1,266 @@
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.utils.cache import get_conditional_response, quote_etag
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.translation import get_language
+
+PAGE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+VERSION_KEY = 'news:ver:{}'
+# Когда последний раз менялась версия LIST — время правок и удалений для Last-Modified
+LIST_CHANGED_KEY = 'news:changed:list'
+# Версии (LIST, CATEGORIES), с которыми список прогревался последний раз
+WARMED_KEY = 'news:warmed:list'
+PAGE_KEY = 'news:page:{view}:{path}:{lang}:{auth}:{versions}'
+
+# Пространства версий: список постов, категории (имена видны на всех страницах), отдельный пост
+LIST = 'list'
+CATEGORIES = 'categories'
+
+
+def post_scope(pk):
+    return f'post:{pk}'
+
+
+# ==================== ВЕРСИИ ====================
+
+def get_versions(*scopes):
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    return [found.get(key, 0) for key in keys]
+
+
+async def aget_versions(*scopes):
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = await cache.aget_many(keys)
+    return [found.get(key, 0) for key in keys]
+
+
+def bump_versions(*scopes):
+    """Новая версия делает недействительными все страницы и фрагменты, собранные со старой"""
+    if LIST in scopes:
+        cache.set(LIST_CHANGED_KEY, time.time(), None)
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+
+def list_changed_at():
+    """Время последней смены версии LIST (создание, правка, удаление поста) или None"""
+    timestamp = cache.get(LIST_CHANGED_KEY)
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc) if timestamp is not None else None
+
+
+def attach_post_versions(posts):
+    """Проставляет post.cache_version для фрагментного кэша строк — один get_many на страницу"""
+    posts = list(posts)
+    versions = get_versions(*(post_scope(post.pk) for post in posts))
+    for post, version in zip(posts, versions):
+        post.cache_version = version
+    return posts
+
+
+# ==================== КЭШ СТРАНИЦ ====================
+
+def normalized_path(request):
+    """Путь с отсортированными непустыми параметрами: /news/?&page=2 (так строит ссылки
+    pagination.html) и /news/?page=2 — одна и та же страница кэша"""
+    params = sorted((key, value) for key, values in request.GET.lists() for value in values)
+    return f'{request.path}?{urlencode(params)}' if params else request.path
+
+
+def page_cache_key(request, view_name, scopes, versions=None):
+    path = hashlib.md5(normalized_path(request).encode()).hexdigest()
+    versions = '.'.join(str(v) for v in (versions if versions is not None else get_versions(*scopes)))
+    auth = 'auth' if request.user.is_authenticated else 'anon'
+    return PAGE_KEY.format(view=view_name, path=path, lang=get_language(), auth=auth, versions=versions)
+
+
+def is_cacheable(request):
+    # Страницы авторизованных пользователей персональны (имя, кнопки), их не кэшируем целиком
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and 'messages' not in request.COOKIES
+    )
+
+
+def cached_response(cached):
+    content, headers = cached
+    response = HttpResponse(content)
+    for name, value in headers.items():
+        response[name] = value
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def store_page(response, key):
+    if response.status_code == 200 and hasattr(response, 'render'):
+        response.add_post_render_callback(lambda r: cache.set(key, (r.content, cached_headers(r)), PAGE_TIMEOUT))
+
+
+# Валидаторы (см. ConditionalPostMixin) хранятся вместе со страницей
+CACHED_HEADERS = ('ETag',)
+
+
+def cached_headers(response):
+    return {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+
+
+class CachedPageMixin:
+    """Кэш целой страницы для анонимных пользователей.
+
+    Ключ включает версии из get_cache_scopes(), поэтому страница устаревает
+    ровно тогда, когда сигнал меняет то, что на ней показано.
+    """
+    cache_view_name = None
+
+    def get_cache_scopes(self):
+        return [LIST, CATEGORIES]
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_cache_key(request, self.cache_view_name or type(self).__name__, self.get_cache_scopes())
+        cached = cache.get(key)
+        if cached is not None:
+            return cached_response(cached)
+
+        response = super().dispatch(request, *args, **kwargs)
+        store_page(response, key)
+        return response
+
+
+def async_cached_page(view_name, get_scopes=lambda request, **kwargs: [LIST, CATEGORIES]):
+    """CachedPageMixin для асинхронных представлений; ключ совпадает с ключом синхронного варианта.
+
+    request.user к этому моменту должен быть уже загружен (см. async_views.prepare_request).
+    """
+    def decorator(view):
+        async def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return await view(request, *args, **kwargs)
+
+            scopes = get_scopes(request, **kwargs)
+            key = page_cache_key(request, view_name, scopes, await aget_versions(*scopes))
+            cached = await cache.aget(key)
+            if cached is not None:
+                return cached_response(cached)
+
+            response = await view(request, *args, **kwargs)
+            store_page(response, key)
+            return response
+        return wrapper
+    return decorator
+
+
+# ==================== УСЛОВНЫЙ GET ====================
+
+def post_etag(request, pk, updated_at):
+    """Страница поста зависит от его updated_at, имён категорий, пользователя и его ролей
+    (навигация и кнопки в default.html). Роли на запрос уже запомнены get_user_roles"""
+    from .caching import get_user_roles
+
+    roles = get_user_roles(request.user)
+    viewer = request.user.pk if request.user.is_authenticated else 'anon'
+    categories_version = get_versions(CATEGORIES)[0]
+    raw = (f'{pk}|{updated_at.isoformat()}|{categories_version}|{viewer}|'
+           f'{roles["has_author"]}|{roles["in_authors_group"]}|{get_language()}')
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def is_conditional(request):
+    # Только If-None-Match: Last-Modified страница не отдаёт — по одной дате не отличить
+    # страницу, собранную для другого пользователя (до входа или после выхода)
+    return (
+        request.method in ('GET', 'HEAD')
+        # С непоказанными flash-сообщениями страница не должна отдаваться из кэша браузера
+        and 'messages' not in request.COOKIES
+        and 'If-None-Match' in request.headers
+    )
+
+
+def updated_at_query(model, pk, post_type):
+    return model.objects.filter(pk=pk, post_type=post_type).values_list('updated_at', flat=True)
+
+
+def set_validators(response, etag):
+    response['ETag'] = etag
+    return response
+
+
+def not_modified(request, pk, updated_at):
+    """Ответ 304, если у клиента актуальная версия поста, иначе None.
+    updated_at is None (пост не найден или другого типа) — обычная обработка"""
+    if updated_at is None:
+        return None
+    etag = post_etag(request, pk, updated_at)
+    response = get_conditional_response(request, etag=etag)
+    return set_validators(response, etag) if response is not None else None
+
+
+class ConditionalPostMixin:
+    """ETag для страницы поста и 304 по нему.
+
+    Условный запрос проверяется по одной колонке updated_at до загрузки поста,
+    кэша страниц и рендеринга шаблона. Обычный запрос берёт валидаторы из уже
+    загруженного поста (или из кэша страниц) без лишних запросов.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        pk = kwargs.get('pk')
+        if is_conditional(request):
+            updated_at = updated_at_query(self.model, pk, self.post_type).first()
+            response = not_modified(request, pk, updated_at)
+            if response is not None:
+                return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        post = getattr(self, 'object', None)
+        if response.status_code == 200 and post is not None and 'messages' not in request.COOKIES:
+            set_validators(response, post_etag(request, pk, post.updated_at))
+        return response
+
+
+# ==================== ПРОГРЕВ ====================
+
+def warm_list_pages(pages=None):
+    """Рендерит первые страницы списка как анонимный пользователь, чтобы они попали в кэш"""
+    from django.contrib.auth.models import AnonymousUser
+    from .views import NewsList
+
+    pages = getattr(settings, 'PAGE_CACHE_WARM_PAGES', 0) if pages is None else pages
+    view = NewsList.as_view()
+    for page in range(1, pages + 1):
+        request = HttpRequest()
+        request.method = 'GET'
+        request.path = request.path_info = reverse('news:news_list')
+        request.GET = QueryDict(urlencode({'page': page}) if page > 1 else '')
+        request.user = AnonymousUser()
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+
+
+def warm_stale_list_pages():
+    """Прогревает список, только если с прошлого прогрева сменились версии. True — прогрел.
+    Вызывается задачей планировщика (news.scheduler), а не потоком на каждую публикацию"""
+    if not getattr(settings, 'PAGE_CACHE_WARM_PAGES', 0):
+        return False
+    # Версии читаются до рендеринга: правка во время прогрева даст ещё один прогрев
+    versions = get_versions(LIST, CATEGORIES)
+    if cache.get(WARMED_KEY) == versions:
+        return False
+    warm_list_pages()
+    cache.set(WARMED_KEY, versions, PAGE_TIMEOUT)
+    return True
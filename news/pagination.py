@@ -0,0 +1,131 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(post, direction):
+    raw = f'{direction}|{post.created_at.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        direction, created_at, pk = raw.split('|')
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(token) from e
+
+
+class CursorPage:
+    """Страница keyset-пагинации по (created_at, id) — без COUNT(*) и OFFSET"""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = encode_cursor(object_list[-1], 'n') if has_next else None
+        self.previous_cursor = encode_cursor(object_list[0], 'p') if has_previous else None
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_page(self, token):
+        """Как Paginator.get_page: битый курсор даёт первую страницу"""
+        direction, created_at, qs = self._page_query(token)
+        page = self._make_page(direction, created_at, list(qs))
+        return page if page is not None else self.get_page(None)
+
+    async def aget_page(self, token):
+        """get_page на async ORM"""
+        direction, created_at, qs = self._page_query(token)
+        page = self._make_page(direction, created_at, [obj async for obj in qs])
+        return page if page is not None else await self.aget_page(None)
+
+    def _page_query(self, token):
+        try:
+            direction, created_at, pk = decode_cursor(token) if token else ('n', None, None)
+        except InvalidCursor:
+            direction, created_at, pk = 'n', None, None
+
+        qs = self.queryset
+        if direction == 'n':
+            if created_at is not None:
+                qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+            return direction, created_at, qs.order_by('-created_at', '-pk')[:self.per_page + 1]
+
+        qs = qs.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        return direction, created_at, qs.order_by('created_at', 'pk')[:self.per_page + 1]
+
+    def _make_page(self, direction, created_at, rows):
+        """None — назад идти некуда, нужна первая страница"""
+        has_more = len(rows) > self.per_page
+        if direction == 'n':
+            return CursorPage(rows[:self.per_page], has_next=has_more, has_previous=created_at is not None)
+        rows = rows[:self.per_page][::-1]
+        if not rows:
+            return None
+        return CursorPage(rows, has_next=True, has_previous=has_more)
+
+
+async def aget_offset_page(paginator, number, strict=False):
+    """Paginator.get_page на async ORM: COUNT и строки страницы — асинхронные запросы.
+    strict — как ListView: 404 на несуществующую страницу вместо ближайшей"""
+    # count — cached_property: заранее посчитанное значение paginator не пересчитывает
+    paginator.count = await paginator.object_list.acount()
+    if strict:
+        try:
+            page = paginator.page(paginator.num_pages if number == 'last' else int(number or 1))
+        except (ValueError, InvalidPage) as e:
+            raise Http404(str(e))
+    else:
+        page = paginator.get_page(number)
+    page.object_list = [obj async for obj in page.object_list]
+    return page
+
+
+def use_cursor_pagination(request, queryset=None):
+    """Курсорный режим включается настройкой NEWS_CURSOR_PAGINATION или параметром ?cursor=.
+
+    Курсор ведёт по (created_at, id): выдачу с другим порядком (поиск по релевантности)
+    он пересортировал бы, поэтому её листаем по номерам страниц.
+    """
+    if queryset is not None and tuple(queryset.query.order_by[:1]) not in ((), ('-created_at',)):
+        return False
+    return getattr(settings, 'NEWS_CURSOR_PAGINATION', False) or 'cursor' in request.GET
+
+
+def pagination_query(request):
+    """GET-параметры фильтров без page/cursor — для ссылок пагинации"""
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    return params.urlencode()
@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+RATE_KEY = 'news:rl:{action}:{ident}:{window}'
+
+# Лимиты по действиям: (сколько, за сколько секунд); переопределяются settings.RATE_LIMITS
+DEFAULT_LIMITS = {
+    'publish_post': (3, 24 * 60 * 60),
+}
+
+
+class RateLimiter:
+    """Скользящее окно на кэше: счётчики текущего и прошлого окна длиной period.
+
+    Оценка за последние period секунд — текущий счётчик плюс доля прошлого,
+    пропорциональная ещё не ушедшей из окна части. Попытка сначала атомарно
+    увеличивает счётчик (cache.incr) и откатывает его при отказе, поэтому
+    параллельные запросы не проскакивают лимит между чтением и записью.
+
+    Счётчики живут в кэше: с несколькими процессами нужен общий бэкенд
+    (Redis, Memcached), иначе у каждого процесса свой лимит.
+    """
+
+    def __init__(self, action, limit=None, period=None):
+        default_limit, default_period = getattr(settings, 'RATE_LIMITS', {}).get(action, DEFAULT_LIMITS[action])
+        self.action = action
+        self.limit = default_limit if limit is None else limit
+        self.period = default_period if period is None else period
+
+    def _key(self, ident, window):
+        return RATE_KEY.format(action=self.action, ident=ident, window=window)
+
+    def hit(self, ident):
+        """Засчитывает действие, если лимит позволяет. True — можно выполнять"""
+        now = time.time()
+        window = int(now // self.period)
+        current, previous = self._key(ident, window), self._key(ident, window - 1)
+
+        # Ключ живёт два окна: следующее окно читает его как прошлое
+        cache.add(current, 0, self.period * 2)
+        try:
+            count = cache.incr(current)
+        except ValueError:
+            # Ключ вытеснили между add и incr
+            cache.set(current, 1, self.period * 2)
+            count = 1
+        weight = 1 - (now % self.period) / self.period
+        if count + (cache.get(previous) or 0) * weight <= self.limit:
+            return True
+        try:
+            cache.decr(current)
+        except ValueError:
+            pass
+        return False
+
+    def refund(self, ident):
+        """Возвращает засчитанную попытку — если действие так и не выполнилось"""
+        current = self._key(ident, int(time.time() // self.period))
+        # Окно могло смениться: в новом счётчике этой попытки нет, уходить ниже нуля нельзя
+        if cache.get(current):
+            try:
+                cache.decr(current)
+            except ValueError:
+                pass
+
+    def period_display(self):
+        """Период для сообщений: «в сутки», «за 2 ч», «за 30 мин»"""
+        if self.period == 24 * 60 * 60:
+            return 'в сутки'
+        for seconds, unit in ((60 * 60, 'ч'), (60, 'мин')):
+            if self.period % seconds == 0:
+                return f'за {self.period // seconds} {unit}'
+        return f'за {self.period} с'
+
+    def reset(self, ident):
+        window = int(time.time() // self.period)
+        cache.delete_many([self._key(ident, window), self._key(ident, window - 1)])
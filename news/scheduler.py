@@ -0,0 +1,118 @@
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'news-scheduler'
+
+
+def make_holder_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def acquire_lease(holder, ttl, name=LEASE_NAME):
+    """Берёт или продлевает аренду. True — holder лидер ещё ttl секунд.
+
+    Один условный UPDATE: продлить может только текущий держатель,
+    перехватить — любой, если аренда просрочена.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=ttl)
+    updated = SchedulerLease.objects.filter(
+        Q(holder=holder) | Q(expires_at__lt=now), name=name,
+    ).update(holder=holder, expires_at=expires_at)
+    if updated:
+        return True
+    try:
+        with transaction.atomic():
+            SchedulerLease.objects.create(name=name, holder=holder, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_lease(holder, name=LEASE_NAME):
+    SchedulerLease.objects.filter(name=name, holder=holder).update(expires_at=timezone.now())
+
+
+# ==================== ЗАДАЧИ ====================
+# Функции задач — на уровне модуля: DjangoJobStore хранит их по ссылке "модуль:имя"
+
+def weekly_digest_job():
+    close_old_connections()
+    try:
+        call_command('weekly_digest')
+    finally:
+        close_old_connections()
+
+
+def delete_old_job_executions(max_age=7 * 24 * 3600):
+    from django_apscheduler.models import DjangoJobExecution
+    close_old_connections()
+    try:
+        DjangoJobExecution.objects.delete_old_job_executions(max_age)
+    finally:
+        close_old_connections()
+
+
+JOB_DEFAULTS = {'max_instances': 1, 'coalesce': True, 'misfire_grace_time': 3600}
+
+
+def ensure_job(scheduler, jobstore, func, trigger, job_id):
+    """Добавляет задачу, только если её нет в хранилище или у неё сменилось расписание.
+
+    replace_existing на каждом старте пересчитал бы next_run_time от текущего момента,
+    и запуск, пропущенный при смене лидера, потерялся бы. С сохранённым next_run_time
+    его выполнит новый лидер в пределах misfire_grace_time.
+    """
+    # До start() scheduler.get_job видит только ещё не добавленные задачи — спрашиваем хранилище
+    job = jobstore.lookup_job(job_id)
+    if job is None or str(job.trigger) != str(trigger):
+        scheduler.add_job(func, trigger=trigger, id=job_id, replace_existing=True, **JOB_DEFAULTS)
+
+
+def warm_list_pages_job():
+    from .page_cache import warm_stale_list_pages
+    close_old_connections()
+    try:
+        warm_stale_list_pages()
+    finally:
+        close_old_connections()
+
+
+def create_scheduler():
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+    from django_apscheduler.jobstores import DjangoJobStore
+
+    scheduler = BackgroundScheduler(timezone=settings.TIME_ZONE)
+    jobstore = DjangoJobStore()
+    scheduler.add_jobstore(jobstore, 'default')
+    ensure_job(
+        scheduler, jobstore, weekly_digest_job, CronTrigger(day_of_week='mon', hour=9, minute=0), 'weekly_digest',
+    )
+    ensure_job(
+        scheduler, jobstore, delete_old_job_executions, CronTrigger(day_of_week='mon', hour=0, minute=0),
+        'delete_old_job_executions',
+    )
+    # Прогрев кэша страниц после публикаций: список рендерится здесь, а не в потоке веб-процесса
+    if getattr(settings, 'PAGE_CACHE_WARM_PAGES', 0):
+        ensure_job(
+            scheduler, jobstore, warm_list_pages_job,
+            IntervalTrigger(seconds=settings.PAGE_CACHE_WARM_INTERVAL), 'warm_list_pages',
+        )
+    elif jobstore.lookup_job('warm_list_pages') is not None:
+        jobstore.remove_job('warm_list_pages')
+    return scheduler
@@ -0,0 +1,110 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = 'news_post_fts'
+
+# Маркеры подсветки в сниппете: экранируются вместе с текстом, потом заменяются на <mark>
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content, content='news_post', content_rowid='id', tokenize='unicode61'
+    )
+    """,
+    # Триггеры покрывают и save(), и bulk_create/update/delete
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON news_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON news_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON news_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+
+
+def fts_supported(conn=None):
+    return (conn or connection).vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """Пользовательский ввод → безопасный запрос FTS5: каждое слово в кавычках, с поиском по префиксу"""
+    words = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def ensure_index(conn=None):
+    """Создаёт таблицу FTS5 и триггеры, если их нет.
+
+    Вызывается после migrate: SQLite пересоздаёт news_post при изменении схемы,
+    и триггеры старой таблицы при этом пропадают.
+    """
+    conn = conn or connection
+    if not fts_supported(conn):
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        exists = cursor.fetchone() is not None
+        for sql in CREATE_SQL:
+            cursor.execute(sql)
+        if not exists:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def rebuild_index(conn=None):
+    conn = conn or connection
+    ensure_index(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_posts(queryset, text):
+    """Полнотекстовый поиск по заголовку и тексту, по релевантности, со сниппетом"""
+    match = build_match_query(text)
+    if not match:
+        return queryset
+
+    if not fts_supported():
+        return queryset.filter(Q(title__icontains=text) | Q(content__icontains=text))
+
+    table = queryset.model._meta.db_table
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+    ).annotate(
+        # Заголовок весит больше текста; bm25 тем меньше, чем релевантнее
+        search_rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,)
+        ),
+        search_snippet=RawSQL(
+            f"SELECT snippet({FTS_TABLE}, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24) "
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,)
+        ),
+    ).order_by('search_rank', '-created_at')
+
+
+def highlight(snippet):
+    if not snippet:
+        return ''
+    html = escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
@@ -1,88 +1,165 @@
-from django.db.models.signals import post_save
+from django.db import connections
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
 from django.dispatch import receiver
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.conf import settings
-from .models import Post
-import os
+from .caching import invalidate_categories_navigation, invalidate_user_roles
+from .page_cache import CATEGORIES, LIST, bump_versions, post_scope
+from .models import Author, Category, Comment, Post, PostCategory, shift_author_ratings
+from .notifications import enqueue_post_notifications, notifications_suspended
+from .search import ensure_index
 
 
+@receiver(post_migrate)
+def ensure_search_index(sender, using, **kwargs):
+    if sender.name == 'news':
+        ensure_index(connections[using])
+
+
+# Рейтинг авторов ведётся инкрементально (см. VotableMixin); здесь — появление
+# и удаление объектов с ненулевым рейтингом. Сверка — команда recompute_ratings.
+
 @receiver(post_save, sender=Post)
-def notify_subscribers_on_post_create(sender, instance, created, **kwargs):
-    if not created or kwargs.get('raw', False) or os.environ.get('DJANGO_AUTO_RELOAD'):
+@receiver(post_save, sender=Comment)
+def add_created_rating(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.rating:
+        shift_author_ratings(*sender.author_rating_deltas({instance.pk: instance.rating}))
+
+
+# Рейтинг в экземпляре может быть устаревшим (голоса пишутся через UPDATE),
+# поэтому актуальное значение читаем из базы до удаления
+
+@receiver(pre_delete, sender=Post)
+def subtract_post_rating(sender, instance, **kwargs):
+    for author_id, rating in Post.objects.filter(pk=instance.pk).values_list('author_id', 'rating'):
+        if rating:
+            shift_author_ratings({author_id: -3 * rating})
+
+
+@receiver(pre_delete, sender=Comment)
+def subtract_comment_rating(sender, instance, **kwargs):
+    rows = Comment.objects.filter(pk=instance.pk).values_list('user_id', 'post__author_id', 'rating')
+    for user_id, post_author_id, rating in rows:
+        if rating:
+            shift_author_ratings({post_author_id: -rating}, {user_id: -rating})
+
+
+# Уведомляем только о новых постах. Категории добавляются после сохранения поста,
+# поэтому сам пост помечается при создании, а outbox заполняется при добавлении категорий
+# к этому же экземпляру (форма создания, добавление в админке). Правка старого поста
+# загружает его из базы заново — метки нет, писем тоже.
+NEW_POST_MARKER = '_news_new_post'
+
+
+@receiver(post_save, sender=Post)
+def mark_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        setattr(instance, NEW_POST_MARKER, True)
+
+
+def is_new_post(post):
+    return getattr(post, NEW_POST_MARKER, False)
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def notify_subscribers_on_categories_add(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or reverse or not pk_set or notifications_suspended():
+        return
+    if is_new_post(instance):
+        enqueue_post_notifications(instance.pk, pk_set)
+
+
+@receiver(post_save, sender=PostCategory)
+def notify_subscribers_on_post_category_create(sender, instance, created, raw=False, **kwargs):
+    # Связи, созданные напрямую (например, инлайном в админке при добавлении поста), минуя post.categories.add()
+    if not created or raw or notifications_suspended() or not PostCategory.post.is_cached(instance):
         return
+    if is_new_post(instance.post):
+        enqueue_post_notifications(instance.post_id, [instance.category_id])
+
+
+
+# ==================== ИНВАЛИДАЦИЯ КЭША ====================
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories_cache(sender, **kwargs):
+    invalidate_categories_navigation()
 
-    print(f"Новая публикация: '{instance.title}'")
 
-    import threading
-    def delayed_notification():
-        import time
-        time.sleep(1)
-        send_post_notifications(instance)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_roles(sender, instance, **kwargs):
+    invalidate_user_roles(instance.user_id)
 
-    thread = threading.Thread(target=delayed_notification, daemon=True)
-    thread.start()
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_group_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_user_roles(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): после очистки состав группы уже не узнать
+        invalidate_user_roles(*instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_roles(*pk_set)
+
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    bump_versions(post_scope(instance.pk), LIST)
 
 
-def send_post_notifications(instance):
-    instance.refresh_from_db()
-    categories = instance.categories.all()
+@receiver(post_save, sender=PostCategory)
+@receiver(post_delete, sender=PostCategory)
+def invalidate_post_category_pages(sender, instance, **kwargs):
+    bump_versions(post_scope(instance.post_id), LIST)
 
-    print(f"Найдено категорий: {categories.count()}")
 
-    if not categories.exists():
-        print("У поста нет категорий")
+@receiver(m2m_changed, sender=Post.categories.through)
+def invalidate_post_categories_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
         return
+    if reverse:
+        # category.posts.add(...): instance — категория, pk_set — посты (при clear — неизвестны)
+        bump_versions(LIST, *(post_scope(pk) for pk in pk_set or ()))
+        if not pk_set:
+            bump_versions(CATEGORIES)
+    else:
+        bump_versions(post_scope(instance.pk), LIST)
 
-    absolute_url = f"http://127.0.0.1:8000{instance.get_absolute_url()}"
-
-    for category in categories:
-        subscribers = category.subscribers.all()
-        print(f"Категория '{category.name}': {subscribers.count()} подписчиков")
-
-        if not subscribers.exists():
-            continue
-
-        preview = instance.content[:50] + '...' if len(instance.content) > 50 else instance.content
-        subject = f'Новость в категории «{category.name}»: {instance.title}'
-
-        html_content = render_to_string(
-            'email/new_post_notification.html',
-            {
-                'category': category,
-                'post': instance,
-                'preview': preview,
-                'post_url': absolute_url,
-            }
-        )
-
-        text_content = f"""
-Здравствуйте!
-
-В вашей любимой категории «{category.name}» появилась новая статья:
-{instance.title}
-
-Краткое содержание:
-{preview}
-
-Читать полностью: {absolute_url}
-
-Это автоматическое письмо. Пожалуйста, не отвечайте на него.
-"""
-
-        for subscriber in subscribers:
-            try:
-                text_content_with_name = text_content.replace('{{subscriber.username}}', subscriber.username)
-
-                msg = EmailMultiAlternatives(
-                    subject=subject,
-                    body=text_content_with_name,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[subscriber.email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                msg.send(fail_silently=True)
-                print(f"Письмо отправлено: {subscriber.email}")
-            except Exception as e:
-                print(f"Ошибка отправки {subscriber.email}: {e}")
\ No newline at end of file
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, **kwargs):
+    bump_versions(CATEGORIES)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    bump_versions(post_scope(instance.post_id))
+
+
+# ==================== ВАЛИДАТОРЫ СТРАНИЦ ПОСТОВ ====================
+# Post.updated_at сам меняется при save(); здесь — то, что показано на странице поста,
+# но хранится в других таблицах
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=PostCategory)
+@receiver(post_delete, sender=PostCategory)
+def touch_post(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).touch()
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def touch_posts_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        if pk_set:
+            Post.objects.filter(pk__in=pk_set).touch()
+    else:
+        Post.objects.filter(pk=instance.pk).touch()
@@ -0,0 +1,173 @@
+import gzip
+import mimetypes
+import os
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Что имеет смысл сжимать: текстовые форматы
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.xml', '.txt', '.html', '.map')
+# Варианты в порядке предпочтения: (Content-Encoding, суффикс файла)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# ==================== СБОРКА (collectstatic) ====================
+
+def compress(path):
+    """Пишет рядом с файлом .gz и (если установлен brotli) .br — только если они заметно меньше"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Имена с хэшем содержимого и манифест (как ManifestStaticFilesStorage)
+    плюс заранее сжатые варианты каждого текстового файла.
+
+    Без collectstatic (разработка, тесты) манифеста нет — ссылки ведут на исходные имена.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Окончательные имена с хэшем известны только после всех проходов
+        for name in {*paths, *self.hashed_files.values()}:
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                compress(self.path(name))
+
+
+# ==================== ОТДАЧА ====================
+
+@dataclass
+class StaticFile:
+    path: str
+    content_type: str
+    mtime: float
+    immutable: bool
+    variants: dict = field(default_factory=dict)  # Content-Encoding -> путь
+
+
+def index_files(root, hashed_names):
+    """Один обход STATIC_ROOT при запуске: на запрос — поиск в словаре, без обращений к диску"""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, name)
+            url_name = os.path.relpath(path, root).replace(os.sep, '/')
+            content_type, _ = mimetypes.guess_type(name)
+            files[url_name] = StaticFile(
+                path=path,
+                content_type=content_type or 'application/octet-stream',
+                mtime=os.stat(path).st_mtime,
+                immutable=url_name in hashed_names,
+                variants={
+                    encoding: path + suffix for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)
+                },
+            )
+    return files
+
+
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding; с q=0 клиент их явно отвергает"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, *params = (item.strip() for item in part.split(';'))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if encoding and q > 0:
+            accepted.add(encoding.lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику из STATIC_ROOT без отдельного веб-сервера.
+
+    Файлы с хэшем в имени кэшируются браузером на STATIC_MAX_AGE с immutable —
+    повторные просмотры не перепроверяют CSS вовсе. Остальные — на минуту
+    с Last-Modified. Готовый .br/.gz выбирается по Accept-Encoding.
+    В DEBUG и без collectstatic не подключается: статику раздаёт runserver.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        root = settings.STATIC_ROOT
+        if settings.DEBUG or not root or not os.path.isdir(root):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        self.files = index_files(root, hashed_names)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        static = self.files.get(request.path[len(self.prefix):])
+        if static is None:
+            return None
+
+        if not static.immutable and not was_modified_since(
+            request.headers.get('If-Modified-Since'), int(static.mtime)
+        ):
+            return HttpResponseNotModified()
+
+        path, encoding = static.path, None
+        accepted = accepted_encodings(request)
+        for candidate, variant in static.variants.items():
+            if candidate in accepted:
+                path, encoding = variant, candidate
+                break
+
+        response = FileResponse(open(path, 'rb'), content_type=static.content_type)
+        del response['Content-Disposition']
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if static.variants:
+            response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(static.mtime)
+        if static.immutable:
+            response['Cache-Control'] = f'public, max-age={settings.STATIC_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=60'
+        return response
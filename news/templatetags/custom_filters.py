@@ -1,23 +1,16 @@
 from django import template
-from news.resources import CENSORED_WORDS
-import re
+from news.censor import censor as censor_text
+from news.metrics import censor_timer
+from news.search import highlight as highlight_snippet
 
 register = template.Library()
 
 @register.filter
 def censor(text):
-    if not isinstance(text, str):
-        return text
+    with censor_timer():
+        return censor_text(text)
 
-    for word in CENSORED_WORDS:
-        if len(word) <= 1:
-            continue
 
-        def replace_match(match):
-            matched_word = match.group()
-            return matched_word[0] + '*' * (len(matched_word) - 1)
-
-        pattern = re.compile(r'\b{}\b'.format(re.escape(word)), re.IGNORECASE)
-        text = pattern.sub(replace_match, text)
-
-    return text
\ No newline at end of file
+@register.filter
+def highlight(snippet):
+    return highlight_snippet(snippet)
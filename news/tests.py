@@ -1,3 +1,1387 @@
-from django.test import TestCase
+import gzip
+import json
+import re
+import tempfile
+import threading
+import time
+from importlib import import_module
+from smtplib import SMTPRecipientsRefused
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from apscheduler.triggers.cron import CronTrigger
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection
+from django.db.models import Sum
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from news.caching import get_categories_navigation, get_user_roles
+from news.censor import CensorEngine
+from news.db_router import READ_ALIAS, ReadWriteRouter, read_only, read_only_request_middleware
+from news.management.commands.bench_censor import legacy_censor
+from news import async_views, mailer, staticfiles, votes
+from news.models import Author, Category, Comment, Post, PostCategory, PostNotification, SchedulerLease
+from news.mailer import Mailer
+from news.metrics import RequestMetricsMiddleware, registry
+from news.notifications import process_batch
+from news.page_cache import warm_list_pages, warm_stale_list_pages
+from news.pagination import CursorPaginator
+from news.ratelimit import RateLimiter
+from news.scheduler import acquire_lease, create_scheduler, release_lease
+from news.search import HIGHLIGHT_END, HIGHLIGHT_START, highlight, rebuild_index, search_posts
+from news.views import NewsEdit
+from news.votes import VoteBuffer
+
+
+class CensorEngineTests(SimpleTestCase):
+    def test_matches_legacy_filter(self):
+        samples = [
+            'Редиска и ДУРАК',
+            'нахрен этот хрен',
+            'гадкий гад',
+            'текст без ругательств',
+            '',
+        ]
+        engine = CensorEngine()
+        for text in samples:
+            self.assertEqual(engine.censor(text), legacy_censor(text))
+
+    def test_non_string_passthrough(self):
+        self.assertIsNone(CensorEngine().censor(None))
+
+    def test_reload_and_bounded_cache(self):
+        engine = CensorEngine(words=['бред'], cache_size=2)
+        self.assertEqual(engine.censor('бред и чушь'), 'б*** и чушь')
+        engine.reload(['чушь'])
+        self.assertEqual(engine.censor('бред и чушь'), 'бред и ч***')
+        for i in range(5):
+            engine.censor(f'чушь {i}')
+        self.assertEqual(engine.cache_info()['size'], 2)
+
+    def test_cache_keeps_no_long_texts(self):
+        engine = CensorEngine(words=['бред'], max_cached_length=20)
+        article = 'бред ' * 100
+        self.assertEqual(engine.censor(article), 'б*** ' * 100)
+        self.assertEqual(engine.cache_info()['size'], 0)
+        self.assertEqual(engine.censor('короткий бред'), 'короткий б***')
+        # Ключ — хэш, сам текст в кэше не хранится
+        [key] = engine._cache
+        self.assertIsInstance(key, bytes)
+        self.assertEqual(len(key), 16)
+
+
+class ListQueryCountTests(TestCase):
+    """Число запросов на страницах списков не должно зависеть от числа строк"""
+
+    # Верхние границы числа запросов на эндпоинт
+    MAX_QUERIES = {
+        'news:news_list': 3,
+        'articles:news_list': 3,
+        'news:news_search': 6,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [Category.objects.create(name=f'Категория {i}') for i in range(3)]
+        cls.authors = [
+            Author.objects.create(user=User.objects.create_user(f'author{i}', f'author{i}@example.com'))
+            for i in range(3)
+        ]
+
+    def create_posts(self, count):
+        posts = Post.objects.bulk_create([
+            Post(author=self.authors[i % 3], post_type='NW' if i % 2 else 'AR',
+                 title=f'Пост {i}', content='Текст ' * 50)
+            for i in range(count)
+        ])
+        PostCategory.objects.bulk_create([
+            PostCategory(post=post, category=category)
+            for post in posts for category in self.categories[:1 + post.pk % 3]
+        ])
+
+    def count_queries(self, url, params=None):
+        cache.clear()  # меряем работу с базой, а не кэш страниц
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_bounded(self):
+        search_params = [
+            {},
+            {'title': 'Пост'},
+            {'author': self.authors[0].pk},
+            {'created_at': '2000-01-01'},
+            {'categories': [c.pk for c in self.categories[:2]]},
+        ]
+        self.create_posts(2)
+        small = {name: self.count_queries(reverse(name)) for name in self.MAX_QUERIES}
+        small_search = [self.count_queries(reverse('news:news_search'), p) for p in search_params]
+
+        self.create_posts(20)
+        for name, limit in self.MAX_QUERIES.items():
+            with self.subTest(endpoint=name):
+                queries = self.count_queries(reverse(name))
+                self.assertLessEqual(queries, limit)
+                self.assertEqual(queries, small[name])
+
+        for params, before in zip(search_params, small_search):
+            with self.subTest(params=params):
+                queries = self.count_queries(reverse('news:news_search'), params)
+                self.assertLessEqual(queries, self.MAX_QUERIES['news:news_search'])
+                self.assertEqual(queries, before)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(user=User.objects.create_user('cursor', 'cursor@example.com'))
+        cls.posts = Post.objects.bulk_create([
+            Post(author=author, post_type='NW', title=f'Пост {i}', content='Текст')
+            for i in range(25)
+        ])
+        # Одинаковое время у части постов — порядок добивается по id
+        Post.objects.filter(pk__in=[p.pk for p in cls.posts[:5]]).update(created_at=cls.posts[0].created_at)
+
+    def test_walks_forward_and_back_without_count(self):
+        expected = list(Post.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        paginator = CursorPaginator(Post.objects.all(), 10)
+
+        seen, pages, token = [], [], None
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                page = paginator.get_page(token)
+            self.assertEqual(len(ctx.captured_queries), 1)
+            self.assertNotIn('COUNT', ctx.captured_queries[0]['sql'])
+            pages.append(page)
+            seen.extend(p.pk for p in page)
+            if not page.has_next():
+                break
+            token = page.next_cursor
+        self.assertEqual(seen, expected)
+
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual([p.pk for p in back], [p.pk for p in pages[-2]])
+
+    def test_views_accept_cursor_and_filters(self):
+        response = self.client.get(reverse('news:news_list'), {'cursor': ''})
+        self.assertEqual(len(response.context['newslist']), 10)
+        next_cursor = response.context['page_obj'].next_cursor
+
+        response = self.client.get(reverse('news:news_search'), {'title': 'Пост', 'cursor': next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'title=')
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+        response = self.client.get(reverse('news:news_list'), {'cursor': 'мусор'})
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(user=User.objects.create_user('fts', 'fts@example.com'))
+        cls.category = Category.objects.create(name='Наука')
+        cls.in_title, cls.in_content, _ = Post.objects.bulk_create([
+            Post(author=cls.author, post_type='NW', title='Телескоп нашёл планету', content='Подробности позже.'),
+            Post(author=cls.author, post_type='AR', title='Обзор недели',
+                 content='Новый телескоп <b>запущен</b> на орбиту.'),
+            Post(author=cls.author, post_type='NW', title='Спорт', content='Футбол.'),
+        ])
+        PostCategory.objects.create(post=cls.in_content, category=cls.category)
+
+    def test_ranked_results_with_snippets(self):
+        results = list(search_posts(Post.objects.all(), 'телескоп'))
+        self.assertEqual(results, [self.in_title, self.in_content])
+        self.assertIn(f'{HIGHLIGHT_START}телескоп{HIGHLIGHT_END}', results[1].search_snippet)
+        self.assertIn('&lt;b&gt;', highlight(results[1].search_snippet))
+        self.assertIn('<mark>телескоп</mark>', highlight(results[1].search_snippet))
+
+    def test_index_follows_updates_and_deletes(self):
+        Post.objects.filter(pk=self.in_title.pk).update(title='Без совпадений')
+        self.in_content.delete()
+        self.assertFalse(search_posts(Post.objects.all(), 'телескоп').exists())
+        rebuild_index()
+        self.assertFalse(search_posts(Post.objects.all(), 'телескоп').exists())
+
+    def test_filter_combines_with_other_criteria(self):
+        response = self.client.get(reverse('news:news_search'), {
+            'q': 'телескоп"', 'categories': [self.category.pk],
+        })
+        self.assertEqual(list(response.context['page_obj']), [self.in_content])
+        self.assertContains(response, '<mark>телескоп</mark>')
+
+    @override_settings(NEWS_CURSOR_PAGINATION=True)
+    def test_cursor_mode_keeps_relevance_order(self):
+        url = reverse('news:news_search')
+        # Курсор по дате поставил бы более новый in_content первым
+        for params in ({'q': 'телескоп'}, {'q': 'телескоп', 'cursor': ''}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(list(response.context['page_obj']), [self.in_title, self.in_content])
+                self.assertFalse(response.context['cursor_mode'])
+        # Без запроса поиска курсор по-прежнему работает
+        self.assertTrue(self.client.get(url, {'title': 'Спорт'}).context['cursor_mode'])
+
+
+class VoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('voter', 'voter@example.com')
+        author = Author.objects.create(user=cls.user)
+        [cls.post] = Post.objects.bulk_create([
+            Post(author=author, post_type='NW', title='Голосование', content='Текст ' * 1000)
+        ])
+        cls.comment = Comment.objects.create(post=cls.post, user=cls.user, text='Комментарий')
+
+    def test_stale_instances_do_not_lose_votes(self):
+        first, second = Post.objects.get(pk=self.post.pk), Post.objects.get(pk=self.post.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            first.like()
+        self.assertNotIn('content', ctx.captured_queries[0]['sql'])
+        second.like()
+        second.dislike()
+        self.comment.dislike()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).rating, 1)
+        self.assertEqual(second.rating, 1)
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).rating, -1)
+
+    def test_edits_keep_flushed_votes(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        stale_comment = Comment.objects.get(pk=self.comment.pk)
+        buffer = VoteBuffer(interval=3600)
+        buffer.add(Post, self.post.pk, 2)
+        buffer.add(Comment, self.comment.pk, 1)
+        buffer.flush()
+
+        stale.title = 'Правка устаревшего экземпляра'
+        stale.save()
+        stale_comment.text = 'Правка комментария'
+        stale_comment.save()
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.title, post.rating), ('Правка устаревшего экземпляра', 2))
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).rating, 1)
+        author = Author.objects.get(user=self.user)
+        Author.objects.recompute_ratings()
+        self.assertEqual(author.rating, Author.objects.get(user=self.user).rating)
+        self.assertEqual(author.rating, 3 * 2 + 1 + 1)
+
+    def test_edit_form_does_not_write_rating(self):
+        category = Category.objects.create(name='Правки')
+        self.client.force_login(self.user)
+        loaded = NewsEdit.get_object
+
+        def load_then_vote(view, *args, **kwargs):
+            # Голос сбрасывается между чтением поста формой и её сохранением
+            post = loaded(view, *args, **kwargs)
+            Post.apply_rating_deltas({post.pk: 1})
+            return post
+
+        with CaptureQueriesContext(connection) as ctx, mock.patch.object(NewsEdit, 'get_object', load_then_vote):
+            response = self.client.post(reverse('news:news_edit', args=[self.post.pk]), {
+                'title': 'Правка формой', 'content': 'Новый текст', 'categories': [category.pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.title, post.rating), ('Правка формой', 1))
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "news_post" SET "author_id"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('"rating"', updates[0])
+
+    def test_concurrent_voters_lose_no_updates(self):
+        buffer = VoteBuffer(interval=3600)
+        voters, votes_each = 32, 250
+
+        def voter(n):
+            for i in range(votes_each):
+                buffer.add(Post, self.post.pk, 1 if (n + i) % 3 else -1)
+                buffer.add(Comment, self.comment.pk, 1)
+
+        threads = [threading.Thread(target=voter, args=(n,)) for n in range(voters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = sum(1 if (n + i) % 3 else -1 for n in range(voters) for i in range(votes_each))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(buffer.flush(), 2)
+        # Рейтинговые UPDATE — по одному на модель (голоса за комментарий ещё сдвигают updated_at поста)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE') and '"rating"' in q['sql']]
+        self.assertEqual(len([sql for sql in updates if 'news_post' in sql.split('SET')[0]]), 1)
+        self.assertEqual(len([sql for sql in updates if 'news_comment' in sql.split('SET')[0]]), 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).rating, expected)
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).rating, voters * votes_each)
+
+    def test_failed_flush_keeps_unwritten_votes(self):
+        buffer = VoteBuffer(interval=3600)
+        buffer.add(Comment, self.comment.pk, 1)
+        buffer.add(Post, self.post.pk, 5)
+
+        def failing(model, deltas, batch_size=500):
+            if model is Comment:
+                raise RuntimeError('БД недоступна')
+            model.apply_rating_deltas(deltas, batch_size)
+
+        with mock.patch('news.votes.apply_deltas', side_effect=failing), self.assertLogs('news.votes', 'ERROR'):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(buffer.pending(Comment, self.comment.pk), 1)
+        self.assertEqual(buffer.pending(Post, self.post.pk), 5)
+
+        self.assertIsNone(buffer._timer)
+        with mock.patch.object(VoteBuffer, 'flush', side_effect=RuntimeError), \
+                mock.patch('news.votes.connection'):
+            buffer._flush_from_timer()
+        self.assertIsNotNone(buffer._timer, 'После неудачного сброса по таймеру таймер заводится снова')
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).rating, 5)
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).rating, 1)
+
+    def test_vote_endpoints(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('news:post_like', args=[self.post.pk])).status_code, 405)
+        self.client.post(reverse('news:post_like', args=[self.post.pk]))
+        self.client.post(reverse('news:post_like', args=[self.post.pk]))
+        self.client.post(reverse('news:comment_dislike', args=[self.comment.pk]))
+        self.assertEqual(self.client.post(reverse('news:post_like', args=[0])).status_code, 404)
+        votes.buffer.flush()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).rating, 2)
+        self.assertEqual(Comment.objects.get(pk=self.comment.pk).rating, -1)
+
+
+def legacy_author_rating(author):
+    """Формула прежнего Author.update_rating()"""
+    post_rating = (author.post_set.aggregate(pr=Sum('rating'))['pr'] or 0) * 3
+    comment_rating = author.user.comment_set.aggregate(cr=Sum('rating'))['cr'] or 0
+    post_comment_rating = Comment.objects.filter(post__author=author).aggregate(pcr=Sum('rating'))['pcr'] or 0
+    return post_rating + comment_rating + post_comment_rating
+
+
+class AuthorRatingTests(TestCase):
+    def setUp(self):
+        users = [User.objects.create_user(f'rating{i}', f'rating{i}@example.com') for i in range(3)]
+        self.authors = [Author.objects.create(user=user) for user in users[:2]]
+        self.posts = Post.objects.bulk_create([
+            Post(author=self.authors[i % 2], post_type='AR', title=f'Пост {i}', content='Текст')
+            for i in range(4)
+        ])
+        self.comments = [
+            Comment.objects.create(post=self.posts[i % 4], user=users[i % 3], text=f'Комментарий {i}')
+            for i in range(9)
+        ]
+
+    def assertRatingsMatchFormula(self):
+        for author in Author.objects.all():
+            self.assertEqual(author.rating, legacy_author_rating(author), author)
+
+    def test_incremental_matches_formula(self):
+        self.posts[0].like()
+        self.posts[0].like()
+        self.posts[1].dislike()
+        self.posts[3].like()
+        for i, comment in enumerate(self.comments):
+            comment.like() if i % 2 else comment.dislike()
+
+        buffer = VoteBuffer(interval=3600)
+        for i in range(30):
+            buffer.add(Post, self.posts[i % 4].pk, 1 if i % 3 else -1)
+            buffer.add(Comment, self.comments[i % 9].pk, 1)
+        buffer.flush()
+        self.assertRatingsMatchFormula()
+
+        Comment.objects.create(post=self.posts[1], user=self.authors[0].user, text='С рейтингом', rating=4)
+        self.assertRatingsMatchFormula()
+        self.comments[2].delete()
+        self.assertRatingsMatchFormula()
+        self.posts[0].delete()
+        self.assertRatingsMatchFormula()
+
+    def test_recompute_command(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(rating=5)
+        Comment.objects.filter(pk=self.comments[1].pk).update(rating=-2)
+        Author.objects.update(rating=100)
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('recompute_ratings', stdout=StringIO())
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertRatingsMatchFormula()
+
+        self.authors[0].update_rating()
+        self.assertEqual(self.authors[0].rating, legacy_author_rating(self.authors[0]))
+
+
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(user=User.objects.create_user('writer', 'writer@example.com'))
+        cls.politics = Category.objects.create(name='Политика')
+        cls.sport = Category.objects.create(name='Спорт')
+        cls.both = User.objects.create_user('both', 'both@example.com')
+        cls.one = User.objects.create_user('one', 'one@example.com')
+        cls.politics.subscribers.add(cls.both, cls.one)
+        cls.sport.subscribers.add(cls.both)
+
+    def create_post(self):
+        post = Post.objects.create(author=self.author, post_type='NW', title='Выборы', content='Текст ' * 20)
+        post.categories.add(self.politics, self.sport)
+        return post
+
+    def test_one_email_per_subscriber(self):
+        post = self.create_post()
+        self.assertEqual(PostNotification.objects.filter(post=post).count(), 2)
+
+        self.assertEqual(process_batch(), (2, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['both@example.com', 'one@example.com'])
+        self.assertFalse(PostNotification.objects.exclude(status=PostNotification.SENT).exists())
+
+        post.categories.add(Category.objects.create(name='Культура'))
+        self.assertEqual(process_batch(), (0, 0))
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.create_post()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=OSError('SMTP недоступен')):
+            self.assertEqual(process_batch(), (0, 2))
+        failed = PostNotification.objects.first()
+        self.assertEqual((failed.status, failed.attempts), (PostNotification.PENDING, 1))
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        self.assertEqual(process_batch(), (0, 0))
+
+        PostNotification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch(), (2, 0))
+
+    def test_editing_old_post_sends_nothing(self):
+        post = Post.objects.create(author=self.author, post_type='NW', title='Старое', content='Текст')
+        culture = Category.objects.create(name='Культура')
+        culture.subscribers.add(self.one)
+
+        self.client.force_login(self.author.user)
+        response = self.client.post(reverse('news:news_edit', args=[post.pk]), {
+            'title': 'Старое', 'content': 'Текст', 'categories': [culture.pk, self.sport.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(post.categories.all()), {culture, self.sport})
+        Post.objects.get(pk=post.pk).categories.add(self.politics)
+        PostCategory.objects.create(post=Post.objects.get(pk=post.pk), category=Category.objects.create(name='Наука'))
+        self.assertFalse(PostNotification.objects.exists())
+
+
+class WeeklyDigestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(user=User.objects.create_user('digest', 'digest@example.com'))
+        cls.category = Category.objects.create(name='Технологии')
+        Category.objects.create(name='Пустая').subscribers.add(author.user)
+        posts = Post.objects.bulk_create([
+            Post(author=author, post_type='AR', title=f'Статья {i}', content='Текст ' * 40)
+            for i in range(5)
+        ])
+        PostCategory.objects.bulk_create([PostCategory(post=p, category=cls.category) for p in posts])
+        cls.category.subscribers.add(*[
+            User.objects.create_user(f'<sub{i}>', f'sub{i}@example.com') for i in range(20)
+        ])
+
+    def test_digest_renders_once_and_personalizes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('weekly_digest', stdout=StringIO(), stderr=StringIO())
+        # Запросы не зависят ни от числа подписчиков, ни от числа постов
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        self.assertFalse([q for q in ctx.captured_queries if '"news_post"."content"' in q['sql']])
+
+        self.assertEqual(len(mail.outbox), 20)
+        html = mail.outbox[3].alternatives[0][0]
+        self.assertIn('&lt;sub3&gt;', html)
+        self.assertIn('<sub3>', mail.outbox[3].body)
+        self.assertIn('<strong>5</strong>', html)
+        self.assertIn('Статья 0', html)
+        self.assertIn(f'/articles/{Post.objects.order_by("-pk").first().pk}/', html)
+
+
+class MailerTests(SimpleTestCase):
+    def messages(self, count):
+        for i in range(count):
+            yield i, EmailMessage('Тема', 'Текст', 'from@example.com', [f'user{i}@example.com'])
+
+    def test_batches_connections_and_failures(self):
+        opened = []
+        original_open = locmem.EmailBackend.open
+
+        def track_open(backend):
+            opened.append(backend)
+            return original_open(backend)
+
+        original_send = locmem.EmailBackend.send_messages
+
+        def flaky_send(backend, messages):
+            if messages[0].to == ['user7@example.com']:
+                raise SMTPRecipientsRefused({'user7@example.com': (550, b'no such user')})
+            return original_send(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, 'open', track_open), \
+                mock.patch.object(locmem.EmailBackend, 'send_messages', flaky_send):
+            report = Mailer(batch_size=10, connections=3).send(self.messages(95))
+
+        self.assertEqual(sorted(report.sent), [i for i in range(95) if i != 7])
+        self.assertEqual(list(report.failed), [7])
+        self.assertEqual(len(mail.outbox), 94)
+        self.assertEqual(len(report.batches), 10)
+        self.assertEqual(sum(b.failed for b in report.batches), 1)
+        # Соединение на поток (+ переподключения после ошибки), а не на письмо
+        self.assertLessEqual(len(opened), 3 + 2)
+
+    def test_rate_limit(self):
+        started = time.monotonic()
+        # Полное ведро (20) уходит сразу, остальные 10 писем — со скоростью 20 в секунду
+        Mailer(batch_size=5, connections=2, rate_limit=20).send(self.messages(30))
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+    def test_fractional_rate_limit(self):
+        clock = [0.0]
+
+        def sleep(seconds):
+            self.assertGreater(seconds, 0)
+            self.assertLess(len(sleeps), 10)
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        sleeps = []
+        with mock.patch('news.mailer.time.monotonic', lambda: clock[0]), mock.patch('news.mailer.time.sleep', sleep):
+            limiter = mailer.RateLimiter(0.5)
+            limiter.acquire(3)
+        # Первое письмо из полного ведра, ещё два — по одному в 2 секунды
+        self.assertAlmostEqual(clock[0], 4.0)
+
+    @override_settings(EMAIL_RATE_LIMIT=40)
+    def test_rate_limit_shared_between_batches(self):
+        # Как deliver: новый Mailer на каждую пачку, пачка (30) близка к ёмкости ведра (40)
+        started = time.monotonic()
+        for _ in range(2):
+            Mailer(batch_size=30, connections=1).send(self.messages(30))
+        # 60 писем при 40 в секунду и ведре на 40: не меньше 0.5 с
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+
+class SchedulerLeaseTests(TestCase):
+    def test_single_leader_until_lease_expires(self):
+        self.assertTrue(acquire_lease('node-a', ttl=60))
+        self.assertFalse(acquire_lease('node-b', ttl=60))
+        self.assertTrue(acquire_lease('node-a', ttl=60))
+
+        SchedulerLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(acquire_lease('node-b', ttl=60))
+        self.assertFalse(acquire_lease('node-a', ttl=60))
+
+        release_lease('node-b')
+        self.assertTrue(acquire_lease('node-a', ttl=60))
+
+    def test_scheduler_jobs(self):
+        scheduler = create_scheduler()
+        self.assertEqual(
+            sorted(job.id for job in scheduler.get_jobs()),
+            ['delete_old_job_executions', 'weekly_digest'],
+        )
+
+    def test_new_leader_keeps_missed_run(self):
+        from django_apscheduler.jobstores import DjangoJobStore
+
+        # Прежний лидер сохранил задачи и не успел выполнить рассылку
+        store = DjangoJobStore()
+        missed = timezone.now() - timedelta(minutes=10)
+        for job in create_scheduler().get_jobs():
+            job.next_run_time = missed
+            store.add_job(job)
+
+        # Новый лидер не пересчитывает расписание — пропущенный запуск остаётся в пределах misfire_grace_time
+        self.assertEqual(create_scheduler().get_jobs(), [])
+        self.assertEqual(store.lookup_job('weekly_digest').next_run_time, missed)
+
+        # Расписание в коде сменилось — задача заменяется
+        job = store.lookup_job('weekly_digest')
+        job.trigger = CronTrigger(day_of_week='fri', hour=9, minute=0)
+        store.update_job(job)
+        self.assertEqual([job.id for job in create_scheduler().get_jobs()], ['weekly_digest'])
+
+    @override_settings(SCHEDULER_LEASE_SECONDS=0.03)
+    def test_lease_errors_do_not_stop_scheduler(self):
+        side_effect = [OperationalError('database is locked'), False, KeyboardInterrupt]
+        err = StringIO()
+        with mock.patch('news.management.commands.runscheduler.acquire_lease', side_effect=side_effect) as acquire:
+            call_command('runscheduler', stdout=StringIO(), stderr=err)
+        self.assertEqual(acquire.call_count, 3)
+        self.assertIn('database is locked', err.getvalue())
+
+
+class CachedContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', 'reader@example.com')
+        self.category = Category.objects.create(name='Экономика')
+
+    def test_navigation_is_cached_and_invalidated(self):
+        self.assertEqual(get_categories_navigation(), [self.category])
+        with self.assertNumQueries(0):
+            get_categories_navigation()
+        other = Category.objects.create(name='Наука')
+        self.assertEqual(get_categories_navigation(), [self.category, other])
+        other.delete()
+        self.assertEqual(get_categories_navigation(), [self.category])
+
+    def test_roles_resolved_once_and_invalidated(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('news:news_list'))
+        self.assertTrue(response.context['is_not_author'])
+
+        request_user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            get_user_roles(request_user)
+            get_user_roles(request_user)
+
+        self.client.get(reverse('news:make_me_author'))
+        roles = get_user_roles(User.objects.get(pk=self.user.pk))
+        self.assertEqual(roles, {'has_author': True, 'in_authors_group': True})
+
+        Group.objects.get(name='authors').user_set.clear()
+        self.assertFalse(get_user_roles(User.objects.get(pk=self.user.pk))['in_authors_group'])
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(user=User.objects.create_user('cached', 'cached@example.com'))
+        cls.category = Category.objects.create(name='Культура')
+        cls.post, cls.other = Post.objects.bulk_create([
+            Post(author=cls.author, post_type='NW', title='Премьера', content='Текст'),
+            Post(author=cls.author, post_type='NW', title='Выставка', content='Текст'),
+        ])
+        PostCategory.objects.create(post=cls.post, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_anonymous_pages_are_cached_and_invalidated(self):
+        detail = reverse('news:news_detail', args=[self.post.pk])
+        other_detail = reverse('news:news_detail', args=[self.other.pk])
+        list_url = reverse('news:news_list')
+        for url in (detail, other_detail, list_url):
+            self.get(url)
+            response, queries = self.get(url)
+            self.assertEqual((response['X-Page-Cache'], queries), ('hit', 0))
+
+        Comment.objects.create(post=self.post, user=self.author.user, text='Браво')
+        self.assertNotIn('X-Page-Cache', self.get(detail)[0])
+        self.assertEqual(self.get(other_detail)[0]['X-Page-Cache'], 'hit')
+        self.assertEqual(self.get(list_url)[0]['X-Page-Cache'], 'hit')
+
+        self.category.name = 'Искусство'
+        self.category.save()
+        response, _ = self.get(list_url)
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'Искусство')
+
+        self.get(detail)
+        Post.objects.get(pk=self.other.pk).save()
+        self.assertNotIn('X-Page-Cache', self.get(list_url)[0])
+        self.assertEqual(self.get(detail)[0]['X-Page-Cache'], 'hit')
+
+    def test_authenticated_pages_are_not_cached(self):
+        self.client.force_login(self.author.user)
+        self.get(reverse('news:news_list'))
+        response, _ = self.get(reverse('news:news_list'))
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'cached')
+
+    def test_warm_list_pages(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, post_type='NW', title=f'Пост {i}', content='Текст') for i in range(12)
+        )
+        warm_list_pages(pages=2)
+        self.assertEqual(self.get(reverse('news:news_list'))[0]['X-Page-Cache'], 'hit')
+        # Адрес из ссылок pagination.html: ?{{ pagination_query }}&page=2
+        self.assertEqual(self.get(reverse('news:news_list') + '?&page=2')[0]['X-Page-Cache'], 'hit')
+
+    @override_settings(PAGE_CACHE_WARM_PAGES=1)
+    def test_scheduler_warms_only_changed_list(self):
+        self.assertIn('warm_list_pages', [job.id for job in create_scheduler().get_jobs()])
+        self.assertTrue(warm_stale_list_pages())
+        self.assertEqual(self.get(reverse('news:news_list'))[0]['X-Page-Cache'], 'hit')
+        with self.assertNumQueries(0):
+            self.assertFalse(warm_stale_list_pages())
+        # Публикация меняет версию списка — следующий такт планировщика прогреет снова
+        Post.objects.create(author=self.author, post_type='NW', title='Свежий', content='Текст')
+        self.assertTrue(warm_stale_list_pages())
+        self.assertContains(self.get(reverse('news:news_list'))[0], 'Свежий')
+
+
+class CategoryListTests(TestCase):
+    def create_data(self, subscribers, posts_per_category):
+        start = User.objects.count()
+        categories = [Category.objects.create(name=f'Категория {start + i}') for i in range(6)]
+        users = User.objects.bulk_create([
+            User(username=f'subscriber-{start}-{i}', email=f'subscriber-{start}-{i}@example.com')
+            for i in range(subscribers)
+        ])
+        Category.subscribers.through.objects.bulk_create([
+            Category.subscribers.through(category=category, user=user)
+            for category in categories for user in users
+        ])
+        posts = Post.objects.bulk_create([
+            Post(author=self.author, post_type='NW', title=f'Пост {i}', content='Текст')
+            for i in range(posts_per_category * 6)
+        ])
+        PostCategory.objects.bulk_create([
+            PostCategory(post=post, category=categories[i % 6]) for i, post in enumerate(posts)
+        ])
+        return categories
+
+    def setUp(self):
+        self.user = User.objects.create_user('categories', 'categories@example.com')
+        self.author = Author.objects.create(user=self.user)
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('news:category_list'))
+        return response, len(ctx.captured_queries)
+
+    def test_constant_queries_and_subscription_state(self):
+        self.client.force_login(self.user)
+        categories = self.create_data(subscribers=2, posts_per_category=2)
+        categories[0].subscribers.add(self.user)
+        _, small = self.count_queries()
+
+        Category.objects.all().delete()
+        categories = self.create_data(subscribers=50, posts_per_category=12)
+        categories[1].subscribers.add(self.user)
+        response, large = self.count_queries()
+        self.assertEqual(small, large)
+
+        by_id = {c.pk: c for c in response.context['categories']}
+        self.assertTrue(by_id[categories[1].pk].is_subscribed)
+        self.assertFalse(by_id[categories[0].pk].is_subscribed)
+        latest = by_id[categories[0].pk].latest_posts
+        self.assertEqual(len(latest), 5)
+        expected = list(categories[0].posts.order_by('-created_at', '-pk')[:5])
+        self.assertEqual(latest, expected)
+        self.assertContains(response, reverse('news:unsubscribe', args=[categories[1].pk]))
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(self.admin)
+        self.author = Author.objects.create(user=self.admin)
+
+    def create_data(self, count):
+        start = Post.objects.count()
+        categories = Category.objects.bulk_create([Category(name=f'Админ {start + i}') for i in range(count)])
+        users = User.objects.bulk_create([User(username=f'admin-user-{start + i}') for i in range(count)])
+        Category.subscribers.through.objects.bulk_create([
+            Category.subscribers.through(category=category, user=user)
+            for category in categories for user in users
+        ])
+        posts = Post.objects.bulk_create([
+            Post(author=self.author, post_type='NW', title=f'Пост {start + i}', content='Текст')
+            for i in range(count)
+        ])
+        PostCategory.objects.bulk_create([
+            PostCategory(post=post, category=category) for post in posts for category in categories[:2]
+        ])
+        Comment.objects.bulk_create([Comment(post=post, user=users[0], text='Комментарий') for post in posts])
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = [reverse(f'admin:news_{name}_changelist') for name in ('post', 'comment', 'category')]
+        self.create_data(2)
+        small = [self.count_queries(url)[1] for url in urls]
+        self.create_data(30)
+        large = [self.count_queries(url)[1] for url in urls]
+        self.assertEqual(small, large)
+
+    def test_autocomplete_filter_loads_only_selected(self):
+        self.create_data(3)
+        category = Category.objects.first()
+        response, _ = self.count_queries(
+            reverse('admin:news_post_changelist') + f'?categories__id__exact={category.pk}'
+        )
+        self.assertContains(response, 'admin-autocomplete')
+        spec = next(s for s in response.context['cl'].filter_specs if s.field_path == 'categories')
+        self.assertEqual([pk for pk, _ in spec.lookup_choices], [category.pk])
+        self.assertEqual(len(response.context['cl'].result_list), Post.objects.filter(categories=category).count())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только в SQLite')
+class QueryPlanTests(TestCase):
+    """Горячие запросы должны идти по индексам, а не полным сканированием таблицы"""
+    FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[3] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, queryset, sorted_by_index=False):
+        plan = self.query_plan(queryset)
+        scans = [step for step in plan if self.FULL_SCAN.match(step)]
+        self.assertFalse(scans, f'Полное сканирование: {plan}')
+        if sorted_by_index:
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_post_lists(self):
+        self.assertUsesIndexes(Post.objects.for_list().order_by('-created_at')[:10], sorted_by_index=True)
+        self.assertUsesIndexes(Post.objects.filter(post_type='NW').order_by('-created_at')[:10], sorted_by_index=True)
+
+    def test_post_comments(self):
+        self.assertUsesIndexes(Comment.objects.filter(post_id=1), sorted_by_index=True)
+
+    def test_digest_posts_per_category(self):
+        since = timezone.now() - timedelta(days=7)
+        category = Category(pk=1)
+        self.assertUsesIndexes(
+            category.posts.filter(created_at__gte=since).select_related('author__user').order_by('-created_at')
+        )
+
+
+class ReadWriteRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadWriteRouter()
+        patcher = mock.patch.object(ReadWriteRouter, 'has_replica', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_go_to_replica_only_in_read_only_requests(self):
+        self.assertIsNone(self.router.db_for_read(Post))
+        with read_only():
+            self.assertEqual(self.router.db_for_read(Post), READ_ALIAS)
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'news'))
+        self.assertFalse(self.router.allow_migrate(READ_ALIAS, 'news'))
+
+    def test_middleware_marks_safe_methods(self):
+        seen = []
+        middleware = read_only_request_middleware(lambda request: seen.append(self.router.db_for_read(Post)))
+        factory = RequestFactory()
+        middleware(factory.get('/'))
+        middleware(factory.post('/'))
+        self.assertEqual(seen, [READ_ALIAS, None])
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_seed_and_run_benchmarks(self):
+        call_command('seed_benchmark_data', users=20, authors=5, categories=4, posts=40,
+                     comments=60, subscriptions_per_user=2, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(PostCategory.objects.count(), 80)
+        self.assertEqual(Category.subscribers.through.objects.count(), 40)
+        self.assertGreater(Post.objects.dates('created_at', 'day').count(), 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'results.json'
+            call_command('run_benchmarks', iterations=2, output=str(output), stdout=StringIO())
+            report = json.loads(output.read_text())
+        self.assertEqual(report['dataset']['posts'], 40)
+        for name in ('news_list', 'search_fulltext', 'post_detail', 'categories', 'weekly_digest'):
+            result = report['results'][name]
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0)
+
+
+class ImportExportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('exporter', 'exporter@example.com')
+        author = Author.objects.create(user=user)
+        categories = [Category.objects.create(name=name) for name in ('Наука', 'Спорт')]
+        subscriber = User.objects.create_user('reader', 'reader@example.com')
+        categories[0].subscribers.add(subscriber)
+        for i in range(5):
+            post = Post.objects.create(author=author, post_type='NW', title=f'Пост {i}', content=f'Текст, "{i}"\nстрока')
+            post.categories.add(*categories[:i % 2 + 1])
+            Comment.objects.create(post=post, user=subscriber, text=f'Комментарий {i}', rating=i)
+
+    def round_trip(self, fmt):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / f'posts.{fmt}')
+            call_command('export_posts', path, chunk_size=2, stdout=StringIO())
+            rows = sorted(Post.objects.values_list('title', 'content', 'created_at'))
+            Post.objects.all().delete()
+            PostNotification.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                call_command('import_posts', path, chunk_size=2, stdout=StringIO())
+        return rows, len(ctx.captured_queries)
+
+    def check_imported(self, rows):
+        self.assertEqual(sorted(Post.objects.values_list('title', 'content', 'created_at')), rows)
+        self.assertEqual(PostCategory.objects.count(), 7)
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertFalse(PostNotification.objects.exists())
+        # Даты из файла пишутся UPDATE, метаданные полей не трогаются
+        self.assertTrue(Post._meta.get_field('created_at').auto_now_add)
+        self.assertTrue(Comment._meta.get_field('created_at').auto_now_add)
+        author = Author.objects.get(user__username='exporter')
+        self.assertEqual(author.rating, legacy_author_rating(author))
+
+    def test_jsonl_round_trip(self):
+        rows, queries = self.round_trip('jsonl')
+        self.check_imported(rows)
+        # Пачками: число запросов зависит от числа пачек, а не строк
+        self.assertLess(queries, 40)
+
+    def test_csv_round_trip(self):
+        rows, _ = self.round_trip('csv')
+        self.check_imported(rows)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(user=User.objects.create_user('feeder'))
+        cls.category = Category.objects.create(name='Космос')
+        other = Category.objects.create(name='Быт')
+        for i in range(6):
+            post = Post.objects.create(author=author, post_type='NW', title=f'Запуск <{i}> & дурак', content='Текст')
+            post.categories.add(cls.category if i % 2 else other)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body.decode()
+
+    def test_formats_are_streamed_and_valid(self):
+        from xml.etree import ElementTree
+
+        _, body = self.get(reverse('news:feed', args=['rss']) + '?limit=4')
+        items = ElementTree.fromstring(body).findall('./channel/item')
+        self.assertEqual(len(items), 4)
+        self.assertEqual(items[0].find('title').text, 'Запуск <5> & д****')
+
+        _, body = self.get(reverse('news:category_feed', args=[self.category.pk, 'atom']))
+        entries = ElementTree.fromstring(body).findall('{http://www.w3.org/2005/Atom}entry')
+        self.assertEqual(len(entries), 3)
+
+        response, body = self.get(reverse('news:feed', args=['json']))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/feed+json; charset=utf-8')
+        self.assertEqual(len(json.loads(body)['items']), 6)
+
+    def test_unchanged_feed_is_304_without_feed_query(self):
+        url = reverse('news:category_feed', args=[self.category.pk, 'rss'])
+        response, _ = self.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            cached, _ = self.get(url, if_none_match=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        cached, _ = self.get(url, if_modified_since=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+        post = Post.objects.create(author=Author.objects.get(), post_type='NW', title='Новый', content='Текст')
+        post.categories.add(self.category)
+        response_after, _ = self.get(url, if_none_match=response['ETag'])
+        self.assertEqual(response_after.status_code, 200)
+        self.assertNotEqual(response_after['ETag'], response['ETag'])
+
+    def test_last_modified_follows_edits_and_deletes(self):
+        url = reverse('news:feed', args=['rss'])
+        hour_ago = timezone.now() - timedelta(hours=1)
+        for change in (lambda post: post.save(), lambda post: post.delete()):
+            Post.objects.update(created_at=hour_ago, updated_at=hour_ago)
+            cache.clear()
+            response, _ = self.get(url)
+            self.assertEqual(self.get(url, if_modified_since=response['Last-Modified'])[0].status_code, 304)
+
+            change(Post.objects.order_by('created_at').first())
+            self.assertEqual(self.get(url, if_modified_since=response['Last-Modified'])[0].status_code, 200)
+
+
+class ConditionalDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('conditional')
+        cls.author = Author.objects.create(user=cls.user)
+        cls.post = Post.objects.create(author=cls.author, post_type='NW', title='Заголовок', content='Текст')
+        cls.url = reverse('news:news_detail', args=[cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def etag_after(self, change):
+        Post.objects.filter(pk=self.post.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        before = self.client.get(self.url)['ETag']
+        change()
+        return before, self.client.get(self.url)['ETag']
+
+    def test_304_after_single_column_lookup(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(self.client.get(self.url)['ETag'], response['ETag'])
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('"updated_at"', ctx.captured_queries[0]['sql'])
+        self.assertNotIn('"content"', ctx.captured_queries[0]['sql'])
+
+        # По одной дате страница не отдаётся: она могла быть собрана для другого пользователя
+        cached = self.client.get(self.url, headers={'if-modified-since': http_date(time.time() + 60)})
+        self.assertEqual(cached.status_code, 200)
+        # Статья по адресу новости — по-прежнему 404
+        self.assertEqual(self.client.get(reverse('articles:article_detail', args=[self.post.pk])).status_code, 404)
+
+    def test_validator_changes_with_post_state(self):
+        def edit():
+            post = Post.objects.get(pk=self.post.pk)
+            post.title = 'Новый заголовок'
+            post.save()
+
+        def comment():
+            Comment.objects.create(post=self.post, user=self.user, text='Комментарий')
+
+        def vote():
+            Post.apply_rating_deltas({self.post.pk: 1})
+
+        def comment_vote():
+            Comment.apply_rating_deltas({Comment.objects.get(post=self.post).pk: 1})
+
+        def category():
+            self.post.categories.add(Category.objects.create(name='Новая'))
+
+        for change in (edit, comment, vote, comment_vote, category):
+            with self.subTest(change=change.__name__):
+                before, after = self.etag_after(change)
+                self.assertNotEqual(before, after)
+
+    def test_validator_changes_with_viewer_roles(self):
+        reader = User.objects.create_user('reader')
+        self.client.force_login(reader)
+        before = self.client.get(self.url)['ETag']
+        self.client.get(reverse('news:make_me_author'))
+        response = self.client.get(self.url, headers={'if-none-match': before})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], before)
+
+
+class AsyncReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async-reader')
+        author = Author.objects.create(user=cls.user)
+        categories = [Category.objects.create(name=f'Рубрика {i}') for i in range(8)]
+        for i in range(14):
+            post = Post.objects.create(author=author, post_type='AR' if i % 4 == 0 else 'NW',
+                                       title=f'Асинхронный пост {i}', content='Текст про телескоп')
+            post.categories.add(categories[i % 8])
+        cls.news = Post.objects.filter(post_type='NW').first()
+        cls.article = Post.objects.filter(post_type='AR').first()
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    def request(self, url, user=None, **headers):
+        request = self.factory.get(url, headers=headers)
+        user = user or AnonymousUser()
+
+        async def auser():
+            return user
+
+        request.auser = auser
+        return request
+
+    def call(self, view, url, user=None, render_queries=0, **kwargs):
+        response = async_to_sync(view)(self.request(url, user), **kwargs)
+        if hasattr(response, 'render'):
+            with CaptureQueriesContext(connection) as ctx:
+                response.render()
+            self.assertEqual(len(ctx.captured_queries), render_queries, 'Рендеринг не должен обращаться к БД')
+        return response
+
+    def test_async_views_match_sync_views(self):
+        cases = [
+            (async_views.news_list, reverse('news:news_list'), {}),
+            (async_views.news_list, reverse('news:news_list') + '?page=2', {}),
+            (async_views.news_list, reverse('news:news_list') + '?cursor=', {}),
+            (async_views.news_search, reverse('news:news_search') + '?q=телескоп&page=2', {}),
+            (async_views.news_search, reverse('news:news_search') + '?q=телескоп&cursor=', {}),
+            (async_views.news_detail, reverse('news:news_detail', args=[self.news.pk]), {'pk': self.news.pk}),
+            (async_views.article_detail, reverse('articles:article_detail', args=[self.article.pk]),
+             {'pk': self.article.pk}),
+            (async_views.category_list, reverse('news:category_list') + '?page=2', {}),
+        ]
+        for view, url, kwargs in cases:
+            with self.subTest(url=url):
+                cache.clear()
+                expected = self.client.get(url)
+                cache.clear()
+                # Варианты авторов и категорий в форме фильтров читает сам виджет при рендеринге
+                render_queries = 2 if view is async_views.news_search else 0
+                response = self.call(view, url, render_queries=render_queries, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content.decode(), expected.content.decode())
+
+    def test_async_detail_404_and_conditional_get(self):
+        with self.assertRaises(Http404):
+            self.call(async_views.news_detail, '/', pk=self.article.pk)
+        with self.assertRaises(Http404):
+            self.call(async_views.news_list, '/?page=99')
+
+        response = self.call(async_views.news_detail, '/', pk=self.news.pk)
+        request = self.request('/', if_none_match=response['ETag'])
+        with CaptureQueriesContext(connection) as ctx:
+            cached = async_to_sync(async_views.news_detail)(request, pk=self.news.pk)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_authenticated_user_is_resolved_before_render(self):
+        Category.objects.first().subscribers.add(self.user)
+        response = self.call(async_views.category_list, reverse('news:category_list'), user=self.user)
+        self.assertContains(response, 'Привет, async-reader!')
+        self.assertContains(response, 'Отписаться')
+
+
+@override_settings(METRICS_SERVER_TIMING=True)
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(user=User.objects.create_user('measured'))
+        Post.objects.bulk_create(
+            Post(author=author, post_type='NW', title=f'Замер {i}', content='текст') for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('news:news_list'))
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'tpl', 'censor', 'total'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['db'])
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_server_timing_can_be_disabled(self):
+        response = self.client.get(reverse('news:news_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertIn('news_request_queries_count{view="news:news_list"} 1', registry.render())
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('news:news_list'))
+        self.client.get(reverse('news:news_list'))
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('news_request_seconds_bucket{view="news:news_list",phase="sql",le="+Inf"} 2', body)
+        self.assertIn('news_request_queries_count{view="news:news_list"} 2', body)
+        self.assertIn('news_request_recent_seconds{view="news:news_list",quantile="0.99"}', body)
+        self.assertIn('news_requests_total{view="news:news_list",status="2xx"} 2', body)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.7').status_code, 403)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_with_heaviest_queries(self):
+        with self.assertLogs('news.metrics', 'WARNING') as logs:
+            self.client.get(reverse('news:news_list'))
+        self.assertIn('news:news_list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_async_request(self):
+        async def view(request):
+            return HttpResponse(str(await Post.objects.acount()))
+
+        middleware = RequestMetricsMiddleware(view)
+        response = async_to_sync(middleware)(AsyncRequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('news_request_queries_sum{view="unmatched"} 1', registry.render())
+
+
+class ExcerptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(user=User.objects.create_user('excerpt'))
+
+    def test_excerpt_computed_on_save(self):
+        post = Post.objects.create(author=self.author, post_type='NW', title='Анонс',
+                                   content='Этот дурак ' + 'слово ' * 30)
+        self.assertEqual(post.excerpt, 'Этот дурак' + ' слово' * 18 + ' …')
+        self.assertTrue(post.excerpt_censored.startswith('Этот д**** слово'))
+
+        post.content = 'Короткий текст'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual((post.excerpt, post.excerpt_censored), ('Короткий текст', 'Короткий текст'))
+
+        # Пост без content (как в списках) анонс не затирает
+        Post.objects.for_list().get(pk=post.pk).save()
+        self.assertEqual(Post.objects.get(pk=post.pk).excerpt, 'Короткий текст')
+
+    def test_lists_do_not_load_content(self):
+        Post.objects.create(author=self.author, post_type='NW', title='Телескоп', content='Текст про дурак')
+        cache.clear()
+        for url in (reverse('news:news_list'), reverse('news:news_search') + '?title=Телескоп',
+                    reverse('news:feed', args=['rss'])):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+            self.assertIn('Текст про д****', body.decode())
+            self.assertFalse([q for q in ctx.captured_queries if '"news_post"."content"' in q['sql']])
+
+    def test_backfill_command(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, post_type='NW', title=f'Пост {i}', content=f'Текст {i}') for i in range(5)
+        ])
+        out = StringIO()
+        call_command('backfill_excerpts', '--chunk-size', '2', stdout=out)
+        self.assertIn('изменено 5', out.getvalue())
+        self.assertEqual(sorted(Post.objects.values_list('excerpt', flat=True)), [f'Текст {i}' for i in range(5)])
+
+        call_command('backfill_excerpts', stdout=out)
+        self.assertIn('изменено 0', out.getvalue())
+
+    def test_migration_fills_censored_excerpts(self):
+        migration = import_module('news.migrations.0006_post_excerpt')
+        Post.objects.bulk_create([
+            Post(author=self.author, post_type='NW', title='До миграции', content='Этот Дурак и нахрен ' + 'слово ' * 30)
+        ])
+        migration.fill_excerpts(apps, None)
+        post = Post.objects.get()
+        # Без backfill_excerpts — так же, как посчитал бы save()
+        expected = (post.excerpt, post.excerpt_censored)
+        post.refresh_excerpt()
+        self.assertEqual(expected, (post.excerpt, post.excerpt_censored))
+        self.assertTrue(post.excerpt_censored.startswith('Этот Д**** и н*****'))
+
+
+class PublishRateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+        cls.category = Category.objects.create(name='Наука')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def publish(self, i):
+        return self.client.post(reverse('news:news_create'), {
+            'title': f'Новость {i}', 'content': 'Текст', 'categories': [self.category.pk],
+        })
+
+    def test_limit_uses_cache_not_count(self):
+        for i in range(3):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.publish(i)
+            self.assertEqual(response.status_code, 302)
+            sqls = [q['sql'] for q in ctx.captured_queries]
+            self.assertFalse([sql for sql in sqls if 'COUNT(' in sql and '"news_post"' in sql])
+            self.assertEqual(len([sql for sql in sqls if sql.startswith('SELECT') and 'FROM "news_author"' in sql]), 1)
+        self.assertEqual(PostCategory.objects.count(), 3)
+
+        response = self.publish(3)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'более 3 постов в сутки')
+        self.assertEqual(Post.objects.count(), 3)
+
+        # Невалидная форма лимит не расходует и не упирается в него раньше времени
+        RateLimiter('publish_post').reset(Author.objects.get().pk)
+        self.client.post(reverse('news:news_create'), {'title': ''})
+        self.assertEqual(self.publish(4).status_code, 302)
+
+    def test_sliding_window(self):
+        limiter = RateLimiter('publish_post', limit=2, period=100)
+        with mock.patch('news.ratelimit.time.time', return_value=1000.0):
+            self.assertTrue(limiter.hit('a'))
+            self.assertTrue(limiter.hit('a'))
+            self.assertFalse(limiter.hit('a'))
+            self.assertTrue(limiter.hit('b'))
+        # Середина следующего окна: прошлые 2 попытки весят 1
+        with mock.patch('news.ratelimit.time.time', return_value=1150.0):
+            self.assertTrue(limiter.hit('a'))
+            self.assertFalse(limiter.hit('a'))
+        with mock.patch('news.ratelimit.time.time', return_value=1200.0):
+            self.assertTrue(limiter.hit('a'))
+
+    @override_settings(RATE_LIMITS={'publish_post': (1, 2 * 60 * 60)})
+    def test_failed_save_refunds_attempt(self):
+        with mock.patch('news.forms.PostForm.save', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            self.publish(0)
+        self.assertEqual(self.publish(1).status_code, 302)
+        # Период из настроек, а не «в сутки»
+        self.assertContains(self.publish(2), 'более 1 постов за 2 ч')
+
+
+class StaticPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(STATIC_ROOT=tmp.name))
+        self.root = Path(tmp.name)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.manifest = json.loads((self.root / 'staticfiles.json').read_text())['paths']
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        hashed = self.manifest['css/news.css']
+        self.assertRegex(hashed, r'^css/news\.[0-9a-f]{12}\.css$')
+        original = (self.root / hashed).read_bytes()
+        self.assertEqual(gzip.decompress((self.root / (hashed + '.gz')).read_bytes()), original)
+        self.assertEqual((self.root / (hashed + '.br')).exists(), staticfiles.brotli is not None)
+
+    def test_pages_link_hashed_names_once(self):
+        html = self.client.get(reverse('news:news_list')).content.decode()
+        self.assertEqual(html.count(f'/static/{self.manifest["css/news.css"]}'), 1)
+        self.assertIn(f'/static/{self.manifest["css/styles.css"]}', html)
+        self.assertNotIn('/static/css/news.css', html)
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        hashed = self.manifest['css/news.css']
+        response = self.client.get(f'/static/{hashed}', headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), (self.root / hashed).read_bytes())
+
+        # q=0 — отказ от кодировки, а не согласие
+        refused = self.client.get(f'/static/{hashed}', headers={'accept-encoding': 'gzip;q=0, identity'})
+        self.assertNotIn('Content-Encoding', refused)
+        weighted = self.client.get(f'/static/{hashed}', headers={'accept-encoding': 'br;q=0, gzip;q=0.5'})
+        self.assertEqual(weighted['Content-Encoding'], 'gzip')
+
+        plain = self.client.get('/static/css/news.css')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertNotIn('immutable', plain['Cache-Control'])
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
@@ -0,0 +1,230 @@
+"""Потоковый импорт и экспорт постов с категориями и комментариями (JSONL/CSV)"""
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import invalidate_categories_navigation
+from .models import Author, Category, Comment, Post, PostCategory
+from .notifications import suspend_notifications
+from .page_cache import CATEGORIES, LIST, bump_versions
+
+FORMATS = ('jsonl', 'csv')
+CSV_FIELDS = ['title', 'content', 'post_type', 'author', 'created_at', 'rating', 'categories', 'comments']
+# Разделитель категорий в CSV; комментарии в CSV — JSON-массив в одной ячейке
+CSV_CATEGORY_SEPARATOR = '|'
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# ==================== ЭКСПОРТ ====================
+
+def export_queryset(chunk_size=1000):
+    """Посты по возрастанию pk; категории и комментарии подгружаются пачкой на каждый chunk"""
+    comments = Comment.objects.select_related('user').order_by('pk')
+    return (
+        Post.objects
+        .select_related('author__user')
+        .prefetch_related(
+            Prefetch('categories', queryset=Category.objects.order_by('name')),
+            Prefetch('comment_set', queryset=comments),
+        )
+        .order_by('pk')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def post_to_row(post):
+    return {
+        'title': post.title,
+        'content': post.content,
+        'post_type': post.post_type,
+        'author': post.author.user.username,
+        'created_at': post.created_at.isoformat(),
+        'rating': post.rating,
+        'categories': [category.name for category in post.categories.all()],
+        'comments': [
+            {
+                'user': comment.user.username,
+                'text': comment.text,
+                'created_at': comment.created_at.isoformat(),
+                'rating': comment.rating,
+            }
+            for comment in post.comment_set.all()
+        ],
+    }
+
+
+def write_rows(stream, fmt, rows):
+    """Пишет строки по одной, не накапливая их. Возвращает количество"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                **row,
+                'categories': CSV_CATEGORY_SEPARATOR.join(row['categories']),
+                'comments': json.dumps(row['comments'], ensure_ascii=False),
+            })
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+# ==================== ИМПОРТ ====================
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {
+                **row,
+                'rating': int(row.get('rating') or 0),
+                'categories': [name for name in (row.get('categories') or '').split(CSV_CATEGORY_SEPARATOR) if name],
+                'comments': json.loads(row['comments']) if row.get('comments') else [],
+            }
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def parse_created_at(value):
+    if not value:
+        return None
+    value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def restore_created_at(model, objects, dates):
+    """created_at с auto_now_add bulk_create перезаписывает текущим временем — даты из файла
+    ставим отдельным UPDATE, как seed_benchmark_data"""
+    for obj, created_at in zip(objects, dates):
+        obj.created_at = created_at
+    model.objects.bulk_update(objects, ['created_at'])
+
+
+class PostImporter:
+    """Импорт пачками: на chunk — несколько bulk_create и без сигналов на каждую строку.
+
+    Недостающие пользователи, авторы и категории создаются; найденные кэшируются
+    между пачками. Письма подписчикам при импорте не ставятся в outbox.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.authors = {}
+        self.categories = {}
+        self.author_ids = set()
+        self.commenter_ids = set()
+        self.posts = 0
+        self.comments = 0
+
+    def import_rows(self, rows, chunk_size=1000):
+        with suspend_notifications():
+            for chunk in chunked(rows, chunk_size):
+                self.import_chunk(chunk)
+                yield len(chunk)
+        self.finish()
+
+    @transaction.atomic
+    def import_chunk(self, rows):
+        self.resolve_users({row['author'] for row in rows}
+                           | {c['user'] for row in rows for c in row.get('comments') or ()})
+        self.resolve_authors({row['author'] for row in rows})
+        self.resolve_categories({name for row in rows for name in row.get('categories') or ()})
+
+        now = timezone.now()
+        posts = [
+            Post(
+                author=self.authors[row['author']],
+                post_type=row['post_type'],
+                title=row['title'],
+                content=row['content'],
+                rating=row.get('rating') or 0,
+            )
+            for row in rows
+        ]
+        # bulk_create не вызывает save(), анонсы считаем сами
+        for post in posts:
+            post.refresh_excerpt()
+        posts = Post.objects.bulk_create(posts)
+        restore_created_at(Post, posts, [parse_created_at(row.get('created_at')) or now for row in rows])
+
+        PostCategory.objects.bulk_create([
+            PostCategory(post=post, category=self.categories[name])
+            for post, row in zip(posts, rows) for name in set(row.get('categories') or ())
+        ], ignore_conflicts=True)
+
+        comment_rows = [(post, c) for post, row in zip(posts, rows) for c in row.get('comments') or ()]
+        comments = Comment.objects.bulk_create([
+            Comment(
+                post=post,
+                user=self.users[c['user']],
+                text=c['text'],
+                rating=c.get('rating') or 0,
+            )
+            for post, c in comment_rows
+        ])
+        restore_created_at(Comment, comments, [parse_created_at(c.get('created_at')) or now for _, c in comment_rows])
+
+        self.author_ids.update(post.author_id for post in posts)
+        self.commenter_ids.update(comment.user_id for comment in comments)
+        self.posts += len(posts)
+        self.comments += len(comments)
+
+    def finish(self):
+        """Рейтинг авторов и кэши, которые обновили бы пропущенные сигналы"""
+        if self.author_ids or self.commenter_ids:
+            Author.objects.filter(Q(pk__in=self.author_ids) | Q(user_id__in=self.commenter_ids)).recompute_ratings()
+        bump_versions(LIST, CATEGORIES)
+        invalidate_categories_navigation()
+
+    def resolve_users(self, usernames):
+        missing = usernames - self.users.keys()
+        if not missing:
+            return
+        for user in User.objects.filter(username__in=missing):
+            self.users[user.username] = user
+        new = [User(username=name, password=make_password(None)) for name in missing - self.users.keys()]
+        for user in User.objects.bulk_create(new):
+            self.users[user.username] = user
+
+    def resolve_authors(self, usernames):
+        missing = usernames - self.authors.keys()
+        if not missing:
+            return
+        for author in Author.objects.filter(user__username__in=missing).select_related('user'):
+            self.authors[author.user.username] = author
+        new = [Author(user=self.users[name]) for name in missing - self.authors.keys()]
+        for author in Author.objects.bulk_create(new):
+            self.authors[author.user.username] = author
+
+    def resolve_categories(self, names):
+        missing = names - self.categories.keys()
+        if not missing:
+            return
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        # ignore_conflicts не возвращает pk — перечитываем и новые, и уже существовавшие
+        self.categories.update({category.name: category for category in Category.objects.filter(name__in=missing)})
@@ -1,4 +1,5 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, register_converter
 from .views import (
     NewsList,
     NewsDetail,
@@ -10,19 +11,54 @@ from .views import (
     CategoryListView,
     subscribe,
     unsubscribe,
+    feed,
+    vote,
 )
+from .models import Comment, Post
+
+
+class FeedFormatConverter:
+    regex = 'rss|atom|json'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+register_converter(FeedFormatConverter, 'feed_format')
+
+# Под ASGI (NEWS_ASYNC_VIEWS) читающие страницы обслуживают асинхронные представления
+if settings.NEWS_ASYNC_VIEWS:
+    from . import async_views
+    news_list_view = async_views.news_list
+    news_detail_view = async_views.news_detail
+    news_search_view = async_views.news_search
+    category_list_view = async_views.category_list
+else:
+    news_list_view = NewsList.as_view()
+    news_detail_view = NewsDetail.as_view()
+    news_search_view = news_search
+    category_list_view = CategoryListView.as_view()
 
 app_name = 'news'
 
 urlpatterns = [
-    path('', NewsList.as_view(), name='news_list'),
-    path('<int:pk>/', NewsDetail.as_view(), name='news_detail'),
-    path('search/', news_search, name='news_search'),
+    path('', news_list_view, name='news_list'),
+    path('<int:pk>/', news_detail_view, name='news_detail'),
+    path('search/', news_search_view, name='news_search'),
     path('create/', NewsCreate.as_view(), name='news_create'),
     path('<int:pk>/edit/', NewsEdit.as_view(), name='news_edit'),
     path('<int:pk>/delete/', NewsDelete.as_view(), name='news_delete'),
     path('make_author/', make_me_author, name = 'make_me_author'),
-    path('categories/', CategoryListView.as_view(), name='category_list'),
+    path('categories/', category_list_view, name='category_list'),
     path('subscribe/<int:pk>/', subscribe, name='subscribe'),
-    path('unsubscribe/<int:pk>/', unsubscribe, name='unsubscribe')
+    path('unsubscribe/<int:pk>/', unsubscribe, name='unsubscribe'),
+    path('<int:pk>/like/', vote, {'model': Post, 'delta': 1}, name='post_like'),
+    path('<int:pk>/dislike/', vote, {'model': Post, 'delta': -1}, name='post_dislike'),
+    path('comments/<int:pk>/like/', vote, {'model': Comment, 'delta': 1}, name='comment_like'),
+    path('comments/<int:pk>/dislike/', vote, {'model': Comment, 'delta': -1}, name='comment_dislike'),
+    path('feeds/<feed_format:fmt>/', feed, name='feed'),
+    path('categories/<int:pk>/feeds/<feed_format:fmt>/', feed, name='category_feed'),
 ]
\ No newline at end of file
@@ -1,6 +1,11 @@
+from collections import defaultdict
+
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.models import Group
-from django.urls import reverse_lazy
+from django.conf import settings
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.views.generic import (
     ListView,
     DetailView,
@@ -8,15 +13,33 @@ from django.views.generic import (
     UpdateView,
     DeleteView,
 )
-from django.http import Http404
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.core.paginator import Paginator
 from .models import Author, Post, Category, PostCategory
+from . import metrics, votes
+from .caching import get_user_roles
+from .page_cache import (
+    CATEGORIES,
+    PAGE_TIMEOUT,
+    CachedPageMixin,
+    ConditionalPostMixin,
+    attach_post_versions,
+    get_versions,
+    post_scope,
+)
+from .feeds import FEED_MAX_AGE, FORMATS as FEED_FORMATS, feed_etag, feed_items, feed_params, newest_post_time
 from .filters import NewsFilter
 from .forms import PostForm
+from .pagination import CursorPaginator, pagination_query, use_cursor_pagination
+from .ratelimit import RateLimiter
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.contrib import messages
+from django.db import transaction
 
 
 # ==================== БАЗОВЫЕ КЛАССЫ ====================
@@ -29,45 +52,55 @@ class BasePostCreate(CreateView):
     template_name = 'post_edit.html'
     post_type = None
 
-    def get_form_kwargs(self):
-        kwargs = super().get_form_kwargs()
-        author, created = Author.objects.get_or_create(user=self.request.user)
-        kwargs['author'] = author
-        return kwargs
+    @cached_property
+    def author(self):
+        """Автор текущего пользователя — один запрос на запрос"""
+        return Author.objects.get_or_create(user=self.request.user)[0]
 
+    @transaction.atomic
     def form_valid(self, form):
-        post = form.save(commit=False)
-        post.post_type = self.post_type
-
-        author, created = Author.objects.get_or_create(user=self.request.user)
-        post.author = author
-
-        post.save()
-        categories = form.cleaned_data.get('categories')
-        post.categories.add(*categories)
-        return super().form_valid(form)
+        # Лимит списывается только за валидную форму, без подсчёта постов в БД
+        limiter = RateLimiter('publish_post')
+        if not limiter.hit(self.author.pk):
+            form.add_error(None, f'Вы не можете публиковать более {limiter.limit} постов {limiter.period_display()}.')
+            return self.form_invalid(form)
+
+        # Пост, его категории и outbox уведомлений фиксируются одной транзакцией
+        form.instance.post_type = self.post_type
+        form.instance.author = self.author
+        try:
+            self.object = form.save()
+        except Exception:
+            # Транзакция откатится, пост не появится — попытка не должна расходовать лимит
+            limiter.refund(self.author.pk)
+            raise
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return self.object.get_absolute_url()
 
 
-class BasePostDetail(DetailView):
+class BasePostDetail(ConditionalPostMixin, CachedPageMixin, DetailView):
     model = Post
     context_object_name = 'newsdetail'
     post_type = None  # Определяется в дочерних классах
     template_name = None  # Определяется в дочерних классах
 
+    def get_cache_scopes(self):
+        return [post_scope(self.kwargs['pk']), CATEGORIES]
+
     def get_queryset(self):
         return Post.objects.filter(post_type=self.post_type)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['is_not_author'] = not self.request.user.groups.filter(name='authors').exists()
+        context['is_not_author'] = not get_user_roles(self.request.user)['in_authors_group']
         return context
 
 
 class BasePostEdit(LoginRequiredMixin, UpdateView):
-    """Базовый класс для редактирования постов"""
+    """Базовый класс для редактирования постов.
+    Сохранение формы не пишет rating — голоса, сброшенные во время правки, остаются"""
     permission_required = 'news.change_post'
     model = Post
     form_class = PostForm
@@ -163,31 +196,103 @@ class ArticleDelete(BasePostDelete):
 
 # ==================== ОСТАЛЬНЫЕ КЛАССЫ И ФУНКЦИИ ====================
 
-class NewsList(ListView):
+class NewsList(CachedPageMixin, ListView):
     model = Post
     ordering = '-created_at'
     template_name = 'news_list.html'
     context_object_name = 'newslist'
     paginate_by = 10
 
+    def get_queryset(self):
+        return super().get_queryset().for_list()
+
+    def paginate_queryset(self, queryset, page_size):
+        if not use_cursor_pagination(self.request):
+            return super().paginate_queryset(queryset, page_size)
+        page = CursorPaginator(queryset, page_size).get_page(self.request.GET.get('cursor'))
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_mode'] = use_cursor_pagination(self.request)
+        context['pagination_query'] = pagination_query(self.request)
+        # Версии для фрагментного кэша строк (см. news_list.html)
+        context['newslist'] = attach_post_versions(context['newslist'])
+        context['categories_version'], = get_versions(CATEGORIES)
+        context['row_cache_timeout'] = PAGE_TIMEOUT
+        return context
+
 
 def news_search(request):
-    filter = NewsFilter(request.GET, queryset=Post.objects.all())
-    paginator = Paginator(filter.qs, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    filter = NewsFilter(request.GET, queryset=Post.objects.for_list().order_by('-created_at'))
+    cursor_mode = use_cursor_pagination(request, filter.qs)
+    if cursor_mode:
+        page_obj = CursorPaginator(filter.qs, 10).get_page(request.GET.get('cursor'))
+    else:
+        page_obj = Paginator(filter.qs, 10).get_page(request.GET.get('page'))
     return render(request, 'news_search.html', {
         'filter': filter,
         'page_obj': page_obj,
         'is_paginated': page_obj.has_other_pages(),
+        'cursor_mode': cursor_mode,
+        'pagination_query': pagination_query(request),
     })
 
 
 class CategoryListView(ListView):
     model = Category
+    ordering = 'name'
     template_name = 'categories.html'
     context_object_name = 'categories'
     paginate_by = 6
+    latest_posts_count = 5
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        categories = list(context['categories'])
+        ids = [category.pk for category in categories]
+        links = list(latest_posts_links(ids, self.latest_posts_count))
+        subscribed = set()
+        if self.request.user.is_authenticated:
+            subscribed = set(subscribed_category_ids(self.request.user, ids))
+        context['categories'] = attach_category_state(categories, links, subscribed)
+        return context
+
+
+def latest_posts_links(category_ids, count):
+    """Последние посты всех категорий страницы одним запросом (ROW_NUMBER() по категории)"""
+    return (
+        PostCategory.objects
+        .filter(category_id__in=category_ids)
+        .annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('category_id'),
+            order_by=[F('post__created_at').desc(), F('post_id').desc()],
+        ))
+        .filter(row_number__lte=count)
+        .select_related('post')
+        .only('category_id', 'post__id', 'post__title', 'post__created_at', 'post__post_type')
+        .order_by('category_id', 'row_number')
+    )
+
+
+def subscribed_category_ids(user, category_ids):
+    """Подписки пользователя — id категорий, без загрузки подписчиков"""
+    return (
+        Category.subscribers.through.objects
+        .filter(user_id=user.pk, category_id__in=category_ids)
+        .values_list('category_id', flat=True)
+    )
+
+
+def attach_category_state(categories, links, subscribed):
+    latest = defaultdict(list)
+    for link in links:
+        latest[link.category_id].append(link.post)
+    for category in categories:
+        category.latest_posts = latest[category.pk]
+        category.is_subscribed = category.pk in subscribed
+    return categories
 
 
 @login_required
@@ -213,4 +318,63 @@ def unsubscribe(request, pk):
     category = get_object_or_404(Category, pk=pk)
     category.subscribers.remove(request.user)
     messages.success(request, f'Вы отписались от категории «{category.name}»')
-    return redirect('news:category_list')
\ No newline at end of file
+    return redirect('news:category_list')
+
+
+@login_required
+@require_POST
+def vote(request, pk, model, delta):
+    """Лайк/дизлайк: голос уходит в буфер и записывается пачкой"""
+    if not model.objects.filter(pk=pk).exists():
+        raise Http404
+    votes.vote(model, pk, delta)
+    return JsonResponse({'id': pk, 'delta': delta, 'pending': votes.buffer.pending(model, pk)})
+
+
+# ==================== ЛЕНТЫ RSS / ATOM / JSON ====================
+
+def _feed_state(request, fmt, pk=None):
+    """Ограничения и время свежего поста — считаются один раз на запрос"""
+    if not hasattr(request, '_feed_state'):
+        limit, days = feed_params(request)
+        request._feed_state = (limit, days, newest_post_time(pk, days))
+    return request._feed_state
+
+
+def _feed_etag(request, fmt, pk=None):
+    limit, days, newest = _feed_state(request, fmt, pk)
+    return feed_etag(fmt, pk, limit, days, newest) if newest else None
+
+
+def _feed_last_modified(request, fmt, pk=None):
+    return _feed_state(request, fmt, pk)[2]
+
+
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def feed(request, fmt, pk=None):
+    """Лента отдаётся потоком; неизменившаяся — 304 без выборки постов"""
+    category = get_object_or_404(Category, pk=pk) if pk is not None else None
+    limit, days, newest = _feed_state(request, fmt, pk)
+    content_type, generate = FEED_FORMATS[fmt]
+    meta = {
+        'title': f'NewsPortal — {category.name}' if category else 'NewsPortal — новости и статьи',
+        'link': settings.SITE_URL + (
+            reverse('news:category_list') + f'#cat-{category.pk}' if category else reverse('news:news_list')
+        ),
+        'feed_url': settings.SITE_URL + request.get_full_path(),
+        'updated': newest or timezone.now(),
+    }
+    response = StreamingHttpResponse(generate(meta, feed_items(pk, limit, days)), content_type=content_type)
+    response['Cache-Control'] = f'public, max-age={FEED_MAX_AGE}'
+    return response
+
+
+# ==================== МЕТРИКИ ====================
+
+def metrics_view(request):
+    """Гистограммы news.metrics в текстовом формате Prometheus.
+    За обратным прокси REMOTE_ADDR — адрес прокси: закрывайте /metrics на нём"""
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        raise PermissionDenied
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
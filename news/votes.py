@@ -0,0 +1,97 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    """Копит голоса в памяти и сбрасывает их пачкой раз в interval секунд.
+
+    Каждый сброс — UPDATE rating = rating + delta по модели и по авторам,
+    других колонок он не трогает; обычные save() рейтинг не пишут (VotableMixin.save),
+    так что правка поста не затирает сброшенные голоса. Таймер заводится только когда есть несброшенные голоса.
+    interval <= 0 — писать сразу, без буфера.
+    """
+
+    def __init__(self, interval=1.0, batch_size=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._timer = None
+
+    def add(self, model, pk, delta):
+        if self.interval <= 0:
+            apply_deltas(model, {pk: delta})
+            return
+
+        with self._lock:
+            self._pending[(model, pk)] += delta
+            self._schedule()
+
+    def _schedule(self):
+        # Вызывается под self._lock
+        if self._timer is None and self._pending:
+            self._timer = threading.Timer(self.interval, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending(self, model, pk):
+        with self._lock:
+            return self._pending.get((model, pk), 0)
+
+    def flush(self):
+        """Записывает накопленные голоса. Возвращает число обновлённых объектов"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        by_model = defaultdict(dict)
+        for (model, pk), delta in pending.items():
+            if delta:
+                by_model[model][pk] = delta
+
+        updated = 0
+        models = list(by_model)
+        for i, model in enumerate(models):
+            try:
+                apply_deltas(model, by_model[model], self.batch_size)
+            except Exception:
+                # В буфер возвращаются голоса этой модели и всех, до которых очередь не дошла
+                logger.exception('Не удалось записать голоса для %s, вернём их в буфер', model.__name__)
+                with self._lock:
+                    for unwritten in models[i:]:
+                        for pk, delta in by_model[unwritten].items():
+                            self._pending[(unwritten, pk)] += delta
+                raise
+            updated += len(by_model[model])
+        return updated
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            # Возвращённые в буфер голоса запишет следующий таймер, не дожидаясь нового голоса
+            with self._lock:
+                self._schedule()
+        finally:
+            connection.close()
+
+
+def apply_deltas(model, deltas, batch_size=500):
+    model.apply_rating_deltas(deltas, batch_size)
+
+
+buffer = VoteBuffer(interval=getattr(settings, 'VOTE_FLUSH_INTERVAL', 1.0))
+atexit.register(buffer.flush)
+
+
+def vote(model, pk, delta):
+    buffer.add(model, pk, delta)